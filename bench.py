@@ -0,0 +1,168 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,here)
+
+import grafoni
+
+# seconds `import grafoni` may take in a fresh interpreter
+startup_target = 0.05
+
+default_sizes = "1K,10K,100K,1M"
+units = {"K":1000,"M":1000*1000}
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in units:
+        return int(float(text[:-1])*units[text[-1]])
+    return int(text)
+
+def time_startup(runs=10):
+    code = "import time; start = time.perf_counter(); import grafoni; print(time.perf_counter() - start)"
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable,"-c",code],cwd=here,check=True,capture_output=True,text=True)
+        times.append(float(result.stdout))
+    return statistics.median(times)
+
+# words drawn from the 1-gram list in proportion to how often they're used, with the odd comma or full stop, until size characters
+def synthetic_text(size,seed=0,path=grafoni.one_grams_path):
+    with open(path,encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    words = [row["ngram"] for row in rows]
+    weights = [float(row["freq"]) for row in rows]
+    rng = random.Random(seed)
+    out = []
+    length = 0
+    while length < size:
+        for word in rng.choices(words,weights,k=1000):
+            punctuation = rng.random()
+            if punctuation < 0.05:
+                word += ","
+            elif punctuation < 0.08:
+                word += "."
+            out.append(word)
+            length += len(word) + 1
+            if length >= size:
+                break
+    return " ".join(out)[:size].rstrip()
+
+# best of repeat runs, with anything the stage prints thrown away
+def timed(stage,repeat):
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = stage()
+            seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best,seconds)
+    return best, result
+
+def bench_size(text,repeat=3):
+    v_scale = 0.5
+    shear_val = -1/3**0.5
+    transform = grafoni.compose(grafoni.scale_matrix(1,v_scale),grafoni.shear_matrix(shear_val))
+    results = {}
+    grafoni.ipa_cache.clear()
+    results["grafoni_spell_cold"], spelled = timed(lambda: grafoni.grafoni_spell(text),1)
+    results["grafoni_spell"], spelled = timed(lambda: grafoni.grafoni_spell(text),repeat)
+    results["process_ends"], ends = timed(lambda: grafoni.process_ends(spelled),repeat)
+    results["make_ligatures"], chars = timed(lambda: grafoni.make_ligatures(ends),repeat)
+    results["layout"], out = timed(lambda: grafoni.layout(chars,shear_val=shear_val,v_scale=v_scale),repeat)
+    # cold stages start with nothing transcribed and no word outlines, like a fresh process
+    grafoni.word_cache.clear()
+    grafoni.ipa_cache.clear()
+    results["layout_text_cold"], _ = timed(lambda: grafoni.layout_text(text,shear_val=shear_val,v_scale=v_scale),1)
+    results["layout_text"], _ = timed(lambda: grafoni.layout_text(text,shear_val=shear_val,v_scale=v_scale),repeat)
+    grafoni.word_cache.clear()
+    grafoni.ipa_cache.clear()
+    results["to_svg_text_cold"], _ = timed(lambda: grafoni.to_svg_text(text,shear_val=shear_val,v_scale=v_scale),1)
+    results["to_svg_text"], _ = timed(lambda: grafoni.to_svg_text(text,shear_val=shear_val,v_scale=v_scale),repeat)
+    results["scale_shear_bounding_box"], _ = timed(lambda: grafoni.bounding_box(grafoni.shear(grafoni.scale(out,1,v_scale),by=shear_val)),repeat)
+    results["bounding_box_transform"], _ = timed(lambda: grafoni.bounding_box(out,transform),repeat)
+    results["exact_bounding_box"], _ = timed(lambda: grafoni.exact_bounding_box(out,transform),repeat)
+    results["svgStrokes"], _ = timed(lambda: grafoni.svgStrokes(out,transform=transform).as_svg(),repeat)
+    results["svgStrokesText"], _ = timed(lambda: grafoni.svgStrokesText(out,transform=transform,precision=2,relative=True),repeat)
+    return results
+
+def run(sizes,repeat=3,seed=0,startup_runs=10):
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "startup": time_startup(startup_runs),
+        "sizes": {},
+    }
+    for size in sizes:
+        text = synthetic_text(size,seed)
+        report["sizes"][str(size)] = bench_size(text,repeat if size <= 100*1000 else 1)
+    return report
+
+# stages that got slower than old by more than threshold (a fraction), as (size, stage, old seconds, new seconds)
+def compare(old,new,threshold=0.1):
+    rows = [("startup","import",old["startup"],new["startup"])]
+    for size,stages in new["sizes"].items():
+        for stage,seconds in stages.items():
+            if stage in old["sizes"].get(size,{}):
+                rows.append((size,stage,old["sizes"][size][stage],seconds))
+    for size,stage,before,after in rows:
+        print("%-8s %-26s %10.4fs %10.4fs %+7.1f%%" % (size,stage,before,after,100*(after/before-1) if before else 0))
+    return [row for row in rows if row[2] and row[3] > row[2]*(1+threshold)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="grafoni benchmarks")
+    commands = parser.add_subparsers(dest="command",required=True)
+    startup = commands.add_parser("startup",help="check how long importing grafoni takes")
+    startup.add_argument("--runs",type=int,default=10)
+    startup.add_argument("--target",type=float,default=startup_target)
+    stages = commands.add_parser("run",help="time every pipeline stage on synthetic text of each size")
+    stages.add_argument("--sizes",default=default_sizes,help="comma separated, e.g. 1K,10K,100K,1M,10M")
+    stages.add_argument("--repeat",type=int,default=3)
+    stages.add_argument("--seed",type=int,default=0)
+    stages.add_argument("--output",help="write the json report here instead of stdout")
+    stages.add_argument("--compare",help="json report to compare against")
+    stages.add_argument("--threshold",type=float,default=0.1)
+    against = commands.add_parser("compare",help="compare two json reports")
+    against.add_argument("old")
+    against.add_argument("new")
+    against.add_argument("--threshold",type=float,default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        seconds = time_startup(args.runs)
+        print("import grafoni: %.1f ms (target %.1f ms)" % (1000*seconds,1000*args.target))
+        return 0 if seconds <= args.target else 1
+
+    if args.command == "run":
+        report = run([parse_size(s) for s in args.sizes.split(",")],args.repeat,args.seed)
+        if args.output:
+            with open(args.output,"w") as f:
+                json.dump(report,f,indent=2)
+        else:
+            json.dump(report,sys.stdout,indent=2)
+            print()
+        if not args.compare:
+            return 0
+        with open(args.compare) as f:
+            old = json.load(f)
+        return 1 if compare(old,report,args.threshold) else 0
+
+    if args.command == "compare":
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        return 1 if compare(old,new,args.threshold) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import argparse
+import csv
+import json
+import sys
+from collections import Counter
+from itertools import islice
+import grafoni
+import glyph_tables
+
+# glyph statistics of a corpus, to decide which kerning entries and ligatures are worth adding next.
+# kerning never crosses a space, so a text's glyph n-grams are the sum of its words' n-grams: the corpus is only split
+# into words and counted (in parallel, a chunk of the file at a time), and every distinct word is transcribed once and
+# its n-grams counted with the word's weight, which is how often it occurs or, with the 1-gram list, its frequency there.
+# glyphs layout can't draw are skipped the same way layout skips them, and counted on their own
+
+chunk_bytes = 4*1024*1024
+words_per_task = 2000
+
+class GlyphCounts:
+    def __init__(self):
+        self.words = 0
+        self.unigrams = Counter()
+        self.bigrams = Counter()
+        self.trigrams = Counter()
+        self.unsupported = Counter()
+
+    def __repr__(self):
+        return "GlyphCounts(%d words, %d glyphs, %d pairs)" % (self.words,len(self.unigrams),len(self.bigrams))
+
+    # adds weight times the n-grams of one word's glyphs
+    def add(self,glyphs,weight=1):
+        drawn = []
+        for l in glyphs:
+            if l in grafoni.letter_forms or l in grafoni.ligatures:
+                drawn.append(l)
+            elif l != " ":
+                self.unsupported[l] += weight
+        self.words += weight
+        for l in drawn:
+            self.unigrams[l] += weight
+        for pair in zip(drawn,drawn[1:]):
+            self.bigrams[pair] += weight
+        for triple in zip(drawn,drawn[1:],drawn[2:]):
+            self.trigrams[triple] += weight
+
+    def update(self,other):
+        self.words += other.words
+        self.unigrams.update(other.unigrams)
+        self.bigrams.update(other.bigrams)
+        self.trigrams.update(other.trigrams)
+        self.unsupported.update(other.unsupported)
+        return self
+
+    def __add__(self,other):
+        return GlyphCounts().update(self).update(other)
+
+    # frequent pairs still kerned with the (-1,-1) default, as (pair, weight, share of all pairs)
+    def default_kerned(self,top_n=50):
+        total = sum(self.bigrams.values()) or 1
+        out = []
+        for pair,weight in self.bigrams.most_common():
+            if (grafoni.last(pair[0]),grafoni.first(pair[1])) not in grafoni.kerning:
+                out.append((pair,weight,weight/total))
+                if len(out) == top_n:
+                    break
+        return out
+
+    # frequent runs of glyphs that aren't a ligature yet, as (glyphs, weight)
+    def ligature_candidates(self,top_n=50):
+        runs = list(self.bigrams.items()) + list(self.trigrams.items())
+        runs = [(glyphs,weight) for glyphs,weight in runs if "_".join(glyphs) not in grafoni.ligatures]
+        return sorted(runs,key=lambda run: run[1],reverse=True)[:top_n]
+
+    def as_dict(self,top_n=50):
+        total = sum(self.bigrams.values())
+        covered = sum(weight for pair,weight in self.bigrams.items() if (grafoni.last(pair[0]),grafoni.first(pair[1])) in grafoni.kerning)
+        return {
+            "words": self.words,
+            "glyphs": sum(self.unigrams.values()),
+            "pairs": total,
+            "kerned_share": covered/total if total else 0,
+            "unigrams": [[l,weight] for l,weight in self.unigrams.most_common(top_n)],
+            "bigrams": [[list(pair),weight] for pair,weight in self.bigrams.most_common(top_n)],
+            "trigrams": [[list(triple),weight] for triple,weight in self.trigrams.most_common(top_n)],
+            "default_kerned": [[list(pair),weight,share] for pair,weight,share in self.default_kerned(top_n)],
+            "ligature_candidates": [[list(glyphs),weight] for glyphs,weight in self.ligature_candidates(top_n)],
+            "unsupported": [[l,weight] for l,weight in self.unsupported.most_common(top_n)],
+        }
+
+# pieces of about chunk_bytes of text from a file object, only ever cut at whitespace
+def iter_chunks(f,size=chunk_bytes):
+    rest = ""
+    while True:
+        text = f.read(size)
+        if not text:
+            break
+        text = rest + text
+        cut = max(text.rfind(" "),text.rfind("\n"),text.rfind("\t"))
+        if cut < 0:
+            rest = text
+            continue
+        rest = text[cut+1:]
+        yield text[:cut+1]
+    if rest:
+        yield rest
+
+def count_words(text):
+    return Counter(text.lower().split())
+
+# glyph n-grams of (word, weight) pairs, transcribed all together
+def count_glyphs(weighted_words):
+    words = [w for w,_ in weighted_words]
+    # one eng_to_ipa query for the whole batch, then every word is a cache hit
+    grafoni.cached_ipa(" ".join(words))
+    # compiled once per worker process
+    ends = glyph_tables.process_ends_many([grafoni.grafoni_spell(w) for w in words],grafoni.compiled_tables())
+    counts = GlyphCounts()
+    for glyphs,(_,weight) in zip(ends,weighted_words):
+        counts.add(grafoni.make_ligatures(glyphs),weight)
+    return counts
+
+# 1-gram words and their frequencies, the most frequent top_n of them if given
+def one_gram_weights(path=grafoni.one_grams_path,top_n=None):
+    weights = Counter()
+    with open(path,encoding="utf-8") as f:
+        for row in islice(csv.DictReader(f),top_n):
+            word = row["ngram"].lower()
+            if word.split() == [word]:
+                weights[word] += float(row["freq"])
+    return weights
+
+# word counts of a file object, read a chunk at a time
+def corpus_weights(f,workers=None):
+    weights = Counter()
+    for counts in grafoni.pool_map(count_words,iter_chunks(f),workers):
+        weights.update(counts)
+    return weights
+
+# glyph n-grams of words weighted by weights (word -> weight)
+def glyph_counts(weights,workers=None,ipa_cache_file=None):
+    items = iter(weights.items())
+    tasks = iter(lambda: list(islice(items,words_per_task)),[])
+    counts = GlyphCounts()
+    for part in grafoni.pool_map(count_glyphs,tasks,workers,ipa_cache_file):
+        counts.update(part)
+    return counts
+
+# glyph n-grams of a corpus file (or the 1-gram list if path is None). with one_grams=True every distinct word of the
+# corpus is weighted by its 1-gram frequency instead of by how often it occurs, and words not in the list are left out
+def corpus_stats(path=None,one_grams=False,top_n=None,workers=None,ipa_cache_file=None,csv_path=grafoni.one_grams_path):
+    if path is None:
+        weights = one_gram_weights(csv_path,top_n)
+    else:
+        with open(path,encoding="utf-8",errors="replace") as f:
+            weights = corpus_weights(f,workers)
+        if one_grams:
+            frequencies = one_gram_weights(csv_path,top_n)
+            weights = Counter({w:frequencies[w] for w in weights if w in frequencies})
+    return glyph_counts(weights,workers,ipa_cache_file)
+
+def print_report(counts,top_n=50,out=sys.stdout):
+    report = counts.as_dict(top_n)
+    out.write("%g words, %g glyphs, %g pairs, %.1f%% of pairs have their own kerning\n" %
+              (report["words"],report["glyphs"],report["pairs"],100*report["kerned_share"]))
+    out.write("\nmost frequent pairs on the default (-1,-1) kerning:\n")
+    for pair,weight,share in report["default_kerned"]:
+        out.write("  %-24s %14g %6.2f%%\n" % (" ".join(pair),weight,100*share))
+    out.write("\nmost frequent runs that aren't ligatures:\n")
+    for glyphs,weight in report["ligature_candidates"]:
+        out.write("  %-24s %14g\n" % (" ".join(glyphs),weight))
+    if report["unsupported"]:
+        out.write("\nglyphs that can't be drawn:\n")
+        for l,weight in report["unsupported"]:
+            out.write("  %-24s %14g\n" % (l,weight))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="glyph frequencies of a corpus, to prioritize kerning and ligatures")
+    parser.add_argument("corpus",nargs="?",help="text file, defaults to the 1-gram list weighted by frequency")
+    parser.add_argument("--one-grams",action="store_true",help="weight the corpus' words by 1-gram frequency instead of by count")
+    parser.add_argument("--one-grams-top",type=int,help="only use the most frequent words of the 1-gram list")
+    parser.add_argument("--workers",type=int,default=None)
+    parser.add_argument("--ipa-cache-file")
+    parser.add_argument("--top",type=int,default=50)
+    parser.add_argument("--json",help="write the full report here as json")
+    args = parser.parse_args(argv)
+    counts = corpus_stats(args.corpus,args.one_grams,args.one_grams_top,args.workers,args.ipa_cache_file)
+    if args.json:
+        with open(args.json,"w") as f:
+            json.dump(counts.as_dict(args.top),f,indent=2,ensure_ascii=False)
+    print_report(counts,args.top)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
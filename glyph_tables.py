@@ -0,0 +1,151 @@
+import numpy as np
+from math import sqrt
+import grafoni
+
+# grafoni's glyph tables compiled down to integers: every glyph (letter form or ligature) gets an id, and kerning and
+# nudging become dense matrices indexed by the id of the last part of the left glyph and the first part of the right one
+class GlyphTables:
+    def __init__(self,names,forms,components,first,last,kern,nudge):
+        self.names = list(names)
+        self.ids = {name:i for i,name in enumerate(self.names)}
+        self.forms = forms
+        self.components = list(components)
+        self.first = np.asarray(first,dtype=np.int32)
+        self.last = np.asarray(last,dtype=np.int32)
+        self.kern = np.asarray(kern,dtype=np.float64)
+        self.nudge = np.asarray(nudge,dtype=np.float64)
+        self.space = self.ids[" "]
+        # plain python copies for the layout loop, where indexing lists beats indexing arrays one element at a time
+        self.first_list = self.first.tolist()
+        self.last_list = self.last.tolist()
+        self.kern_list = self.kern.tolist()
+        self.nudge_list = self.nudge.tolist()
+        self.extended = {}
+        self.ligature_trie = grafoni.ligature_trie([n for n in self.names if "_" in n],self.ids.get,self.ids.get)
+        self.compile_ends()
+
+    def __repr__(self):
+        return "GlyphTables(%d glyphs, %d components)" % (len(self.names),len(self.components))
+
+    def encode(self,chars):
+        return [self.ids.get(c,-1) for c in chars]
+
+    def decode(self,ids):
+        return [self.names[i] for i in ids]
+
+    # grafoni.process_ends' rules as arrays indexed by glyph id. they have one more entry than there are glyphs, which is
+    # what -1 (a glyph we can't draw) indexes, so those glyphs match no rule and pass through unchanged
+    def compile_ends(self):
+        n = len(self.names) + 1
+        self.end_mark = np.zeros(n,dtype=bool)
+        self.end_mark[[self.ids[c] for c in grafoni.end_marks if c in self.ids]] = True
+        self.begin_form = np.full(n,-1,dtype=np.intp)
+        self.end_form = np.full(n,-1,dtype=np.intp)
+        # begin_blocked[m,r] when the glyph r after m stops m taking its beginning form, end_blocked[m,l] likewise
+        self.begin_blocked = np.zeros((n,n),dtype=bool)
+        self.end_blocked = np.zeros((n,n),dtype=bool)
+        for forms,form,blocked,suffix in ((grafoni.begin_forms,self.begin_form,self.begin_blocked,"-beg"),
+                                          (grafoni.end_forms,self.end_form,self.end_blocked,"-end")):
+            for name,neighbours in forms.items():
+                if name in self.ids and name + suffix in self.ids:
+                    form[self.ids[name]] = self.ids[name + suffix]
+                    blocked[self.ids[name],[self.ids[c] for c in neighbours if c in self.ids]] = True
+
+    # form of glyph i with its first stroke stretched by r_kern, built once per pair
+    def l_extended(self,i,r_kern):
+        key = (i,r_kern)
+        if key not in self.extended:
+            self.extended[key] = grafoni.l_extend(self.forms[i],r_kern)
+        return self.extended[key]
+
+def compile_tables():
+    names = list(grafoni.letter_forms) + [l for l in grafoni.ligatures if l not in grafoni.letter_forms]
+    forms = [grafoni.letter_forms[l] if l in grafoni.letter_forms else grafoni.ligatures[l] for l in names]
+    components = list(dict.fromkeys([grafoni.first(l) for l in names] + [grafoni.last(l) for l in names]))
+    component_ids = {c:i for i,c in enumerate(components)}
+    first = [component_ids[grafoni.first(l)] for l in names]
+    last = [component_ids[grafoni.last(l)] for l in names]
+    kern = np.empty((len(components),len(components),2))
+    kern[:] = grafoni.kerning.default_factory()
+    nudge = np.full((len(components),len(components)),float(grafoni.nudge_kern.default_factory()))
+    for (a,b),value in grafoni.kerning.items():
+        if a in component_ids and b in component_ids:
+            kern[component_ids[a],component_ids[b]] = value
+    for (a,b),value in grafoni.nudge_kern.items():
+        if a in component_ids and b in component_ids:
+            nudge[component_ids[a],component_ids[b]] = value
+    return GlyphTables(names,forms,components,first,last,kern,nudge)
+
+# grafoni.process_ends on an array of glyph ids, every position at once. texts can be joined with a space between them
+# (the same as process_ends puts around each) and done in one call
+def process_ends_ids(ids,tables):
+    padded = np.concatenate([[tables.space],np.asarray(ids,dtype=np.intp),[tables.space]])
+    l, m, r = padded[:-2], padded[1:-1], padded[2:]
+    begin = tables.end_mark[l] & (tables.begin_form[m] >= 0) & ~tables.begin_blocked[m,r]
+    end = ~begin & tables.end_mark[r] & (tables.end_form[m] >= 0) & ~tables.end_blocked[m,l]
+    out = m.copy()
+    out[begin] = tables.begin_form[m[begin]]
+    out[end] = tables.end_form[m[end]]
+    return out
+
+# the same as [grafoni.process_ends(s) for s in spelled] for many grafoni_spell outputs, done in one pass over all of them
+def process_ends_many(spelled,tables=None):
+    tables = tables or grafoni.compiled_tables()
+    flat = []
+    for s in spelled:
+        flat += s
+        flat.append(" ")
+    out = process_ends_ids(tables.encode(flat),tables).tolist()
+    names = tables.names
+    glyphs = [names[i] if i >= 0 else c for i,c in zip(out,flat)]
+    result = []
+    start = 0
+    for s in spelled:
+        result.append(glyphs[start:start+len(s)])
+        start += len(s) + 1
+    return result
+
+# grafoni.make_ligatures on glyph ids, longest match first so ligatures can have any number of parts
+def make_ligatures_ids(ids,tables):
+    return grafoni.match_ligatures(ids,tables.ligature_trie)
+
+# same strokes as grafoni.layout, with every kerning and nudging lookup done on glyph ids (-1 for glyphs we can't draw)
+def layout_ids(ids,tables,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5):
+    first, last, kern, nudge = tables.first_list, tables.last_list, tables.kern_list, tables.nudge_list
+    out = [('move',0,0)]
+    last_id = tables.space
+    for i in ids:
+        if i >= 0:
+            l_kern,r_kern = kern[last[last_id]][first[i]]
+            grafoni.r_extend_in_place(out,l_kern)
+            grafoni.v_nudge_in_place(out,nudge[last[last_id]][first[i]])
+            last_x, last_y = out[-1][-2:]
+            out += grafoni.translate(tables.l_extended(i,r_kern),last_x,last_y)
+            last_id = i
+        if last_id == tables.space and out[-1][-2] + shear_val*v_scale*out[-1][-1] > wrap:
+            out.append(('move',-shear_val*v_scale*(out[-1][-1]+line_space),out[-1][-1]+line_space))
+    return out
+
+# same strokes as grafoni.build_outline: a word's glyph ids (all drawable) drawn after a space, without the starting move
+def outline_ids(ids,tables):
+    first, last, kern, nudge = tables.first_list, tables.last_list, tables.kern_list, tables.nudge_list
+    i = ids[0]
+    out = [('move',0,0)] + grafoni.translate(tables.l_extended(i,kern[last[tables.space]][first[i]][1]),0,0)
+    last_id = i
+    for i in ids[1:]:
+        l_kern,r_kern = kern[last[last_id]][first[i]]
+        grafoni.r_extend_in_place(out,l_kern)
+        grafoni.v_nudge_in_place(out,nudge[last[last_id]][first[i]])
+        last_x, last_y = out[-1][-2:]
+        out += grafoni.translate(tables.l_extended(i,r_kern),last_x,last_y)
+        last_id = i
+    return out[1:]
+
+def layout(chars,tables=None,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5):
+    tables = tables or grafoni.compiled_tables()
+    ids = tables.encode(chars)
+    if grafoni.profiling:
+        for c,i in zip(chars,ids):
+            if i < 0:
+                grafoni.emit("unsupported:" + c)
+    return layout_ids(ids,tables,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale)
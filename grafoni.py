@@ -1,9 +1,170 @@
-import eng_to_ipa as ipa
-import drawsvg as draw
+import csv
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import re
+import sys
+import unicodedata
 from math import sqrt
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from itertools import islice
+from time import perf_counter
 
-convert_dict = {
+# eng_to_ipa and drawsvg take most of the time importing grafoni, so they are only really imported the first time they are used
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError("No module named " + repr(name))
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+ipa = lazy_import("eng_to_ipa")
+draw = lazy_import("drawsvg")
+packed_strokes = lazy_import("packed_strokes")
+glyph_tables = lazy_import("glyph_tables")
+
+# opt-in instrumentation: while any hook is registered, every hook is called as hook(event,value) for
+# "time:<stage>" (seconds spent in a call of that stage, nested stages are counted in both), the counters
+# words_transcribed, ipa_cache_hits, ipa_lookups, ipa_guesses, word_cache_hits, word_cache_misses, strokes and bytes_written,
+# and "unsupported:<glyph>" for every glyph we have no form for.
+# stages are timed by swapping timed versions of their functions into the module, and put back once the last hook
+# is removed, so with no hooks nothing is timed and the counters cost one check of profiling
+profiling = False
+hooks = []
+stages = {"grafoni_spell":"spell","lookup_ipa":"ipa","process_ends":"process_ends","make_ligatures":"make_ligatures",
+          "layout":"layout","layout_text":"layout","bounding_box":"bounding_box","exact_bounding_box":"bounding_box","path_data":"path_data"}
+untimed = {}
+
+def emit(event,value=1):
+    for hook in hooks:
+        hook(event,value)
+
+def timed_stage(name,f):
+    def timed(*args,**kwargs):
+        start = perf_counter()
+        try:
+            return f(*args,**kwargs)
+        finally:
+            emit("time:" + name,perf_counter()-start)
+    return timed
+
+def add_hook(hook):
+    global profiling
+    hooks.append(hook)
+    if not profiling:
+        profiling = True
+        for f,name in stages.items():
+            untimed[f] = globals()[f]
+            globals()[f] = timed_stage(name,untimed[f])
+
+def remove_hook(hook):
+    global profiling
+    hooks.remove(hook)
+    if profiling and not hooks:
+        profiling = False
+        globals().update(untimed)
+        untimed.clear()
+
+# totals of every event while the block runs, passed on to hook as well if given
+#   with grafoni.profile() as counts:
+#       grafoni.to_svg_text(text)
+@contextmanager
+def profile(hook=None):
+    counts = defaultdict(float)
+    def collect(event,value):
+        counts[event] += value
+    add_hook(collect)
+    if hook is not None:
+        add_hook(hook)
+    try:
+        yield counts
+    finally:
+        remove_hook(collect)
+        if hook is not None:
+            remove_hook(hook)
+
+# text stream wrapper that counts what goes through it as bytes_written (svg output is all ascii), only used while profiling
+class CountingWriter:
+    def __init__(self,out):
+        self.out = out
+        self.count = 0
+
+    def write(self,text):
+        self.count += len(text)
+        return self.out.write(text)
+
+    def __getattr__(self,name):
+        return getattr(self.out,name)
+
+# the tables everything is drawn from (convert_dict, letter_forms, ligatures, kerning, nudge_kern and letter_sounds) are
+# TableDicts, which count every edit in tables_version, so anything built from them is rebuilt on its next use without
+# hashing the tables again. tables_state() also changes if one of them is replaced by another dict. only changing a
+# form's strokes in place goes unnoticed, so call tables_changed() after doing that
+tables_version = 0
+
+def tables_changed():
+    global tables_version
+    tables_version += 1
+
+class TableDict(dict):
+    def __setitem__(self,key,value):
+        tables_changed()
+        dict.__setitem__(self,key,value)
+
+    def __delitem__(self,key):
+        tables_changed()
+        dict.__delitem__(self,key)
+
+    def __ior__(self,other):
+        self.update(other)
+        return self
+
+    def update(self,*args,**kwargs):
+        tables_changed()
+        dict.update(self,*args,**kwargs)
+
+    def setdefault(self,key,default=None):
+        if key not in self:
+            tables_changed()
+        return dict.setdefault(self,key,default)
+
+    def pop(self,*args):
+        tables_changed()
+        return dict.pop(self,*args)
+
+    def popitem(self):
+        tables_changed()
+        return dict.popitem(self)
+
+    def clear(self):
+        tables_changed()
+        dict.clear(self)
+
+# a TableDict with defaults like defaultdict. looking up a missing key stores the default without counting as an edit,
+# since nothing drawn changes
+class DefaultTableDict(TableDict):
+    def __init__(self,default_factory,*args):
+        dict.__init__(self,*args)
+        self.default_factory = default_factory
+
+    def __missing__(self,key):
+        value = self.default_factory()
+        dict.__setitem__(self,key,value)
+        return value
+
+def tables_state():
+    return (tables_version,id(convert_dict),id(letter_forms),id(ligatures),id(kerning),id(nudge_kern),id(letter_sounds))
+
+convert_dict = TableDict({
     'i': ["uv1","uv1"], # sometimes can be duplicated like "see"
     'ɪ': ["uv1"],
     'ɛ': ["uv2"],
@@ -35,11 +196,11 @@ convert_dict = {
     '*': [],
     
     ' ': [" "]
-}
+})
 
 vowel_scale = 1.5
 
-letter_forms = {
+letter_forms = TableDict({
     " ": [('move',4,0)],
 
     "uv1": [('quadratic',1*vowel_scale,-1*vowel_scale,2*vowel_scale,0)],
@@ -136,10 +297,10 @@ letter_forms = {
     "8": [('move',0,-8),('line',0,-4),('quadratic',0,0,-1,0),('quadratic',-2,0,0,-4),('move',3,0)],
     "9": [('move',0,-8),('quadratic',2,-4,0,0),('move',3,0)],
     "0": [('move',0,-4),('quadratic',1,-5,2,-4),('move',3,0)],
-}
+})
 
 # this dictionary will hold kerning instructions for pairs of letters, it says how much to kern the left letter on the right and the right letter on the left
-kerning = defaultdict(lambda: (-1,-1))
+kerning = DefaultTableDict(lambda: (-1,-1))
 kerning[("t-beg","r")] = (-1,2)
 kerning[("t-beg","l")] = (-1,2)
 kerning[("d-beg","r")] = (-1,2)
@@ -318,7 +479,7 @@ kerning[("zh","m")] = (-1,1)
 kerning[("m","sh")] = (1,-1)
 kerning[("m","zh")] = (1,-1)
 
-ligatures = {
+ligatures = TableDict({
     "n_t": [('cubic',1,2,1,4,0,4),('cubic',-1,4,-1,2,0,0),('quadratic',1,-2,1,-4),('line',1,0)],
     "n_d": [('cubic',1,2,1,4,0,4),('cubic',-1,4,-1,2,0,0),('quadratic',1,-2,1,-4),('line',1,-8),('line',1,0)],
     "ng_t": [('cubic', 1, 2, 1, 8, 0, 8), ('cubic', -1, 8, -1, 2, 0, 0), ('quadratic',1,-2,1,-4),('line',1,0)],
@@ -426,13 +587,119 @@ ligatures = {
 
     "s_m": [('quadratic', 0, -4, 1, -4), ('quadratic', 2, -4, 2, 0), ('cubic', 2, 1, 2, 2, 1.5, 2), ('cubic', 1, 2, 1, 1, 2, 0)],
     "z_m": [('quadratic', 0, -8, 1, -8), ('quadratic', 2, -8, 2, 0), ('cubic', 2, 1, 2, 2, 1.5, 2), ('cubic', 1, 2, 1, 1, 2, 0)]
-}
+})
 
 def keep_some_y_w(in_string):
     return in_string.replace('wu','uWu').replace('ji','ɪYɪ').replace('iɪŋ','ɪɪYɪŋ').replace('iiŋ','ɪYɪŋ')
 
+# eng_to_ipa transcribes every whitespace separated word on its own, so we can remember words instead of whole strings
+# the least recently used words get dropped once there are more than ipa_cache_size of them
+ipa_cache = OrderedDict()
+ipa_cache_size = 50000
+one_grams_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),"dev_garbage","1grams_english.csv")
+
+def lru_put(cache,key,value,size):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+def remember_ipa(word,transcription):
+    lru_put(ipa_cache,word,transcription,ipa_cache_size)
+
+# a rough guess at the ipa of words eng_to_ipa doesn't know (it gives those back as the word with a *), so they still
+# come out as glyphs instead of latin letters we can't draw. spellings are matched longest first, and a spelling ending
+# in $ only matches at the end of a word. letters without a rule are kept, and anything left we can't draw is dropped
+letter_sounds = TableDict({
+    "tch":"ʧ", "sch":"sk", "igh":"aɪ", "ough":"ɔ", "augh":"ɔ", "eigh":"eɪ", "tion":"ʃən", "sion":"ʒən", "ture":"ʧər", "dge":"ʤ",
+    "ch":"ʧ", "sh":"ʃ", "th":"θ", "ph":"f", "wh":"w", "ck":"k", "ng":"ŋ", "qu":"kw", "gh":"g", "kn":"n", "wr":"r",
+    "ee":"i", "ea":"i", "ie":"i", "ei":"eɪ", "ai":"eɪ", "ay":"eɪ", "ey":"eɪ", "oa":"oʊ", "oe":"oʊ", "oo":"u", "ou":"aʊ",
+    "ow":"aʊ", "oi":"ɔɪ", "oy":"ɔɪ", "au":"ɔ", "aw":"ɔ", "ew":"ju", "ue":"u", "ui":"u",
+    "ar":"ɑr", "er":"ər", "ir":"ər", "ur":"ər", "or":"ɔr",
+    "ci":"sɪ", "cy":"si", "ce$":"s", "ge$":"ʤ", "le$":"əl", "ed$":"d", "e$":"", "y$":"i",
+    "bb":"b", "cc":"k", "dd":"d", "ff":"f", "gg":"g", "ll":"l", "mm":"m", "nn":"n", "pp":"p", "rr":"r", "ss":"s", "tt":"t", "zz":"z",
+    "a":"æ", "b":"b", "c":"k", "d":"d", "e":"ɛ", "f":"f", "g":"g", "h":"h", "i":"ɪ", "j":"ʤ", "k":"k", "l":"l", "m":"m",
+    "n":"n", "o":"ɑ", "p":"p", "q":"k", "r":"r", "s":"s", "t":"t", "u":"ə", "v":"v", "w":"w", "x":"ks", "y":"j", "z":"z",
+})
+
+# rebuilt whenever letter_sounds changes
+letter_sounds_state = None
+letter_sounds_pattern = None
+letter_sounds_order = None
+
+def guess_ipa(word):
+    global letter_sounds_state, letter_sounds_pattern, letter_sounds_order
+    if letter_sounds_state != tables_state():
+        letter_sounds_state = tables_state()
+        spellings = sorted(letter_sounds,key=lambda k: (-len(k.rstrip("$")),not k.endswith("$")))
+        letter_sounds_pattern = re.compile("|".join("(%s%s)" % (re.escape(k.rstrip("$")),"(?![a-z])" if k.endswith("$") else "") for k in spellings))
+        letter_sounds_order = [letter_sounds[k] for k in spellings]
+    # accents off, so café is spelled like cafe
+    word = "".join(c for c in unicodedata.normalize("NFKD",word.lower()) if not unicodedata.combining(c))
+    sounds = letter_sounds_pattern.sub(lambda m: letter_sounds_order[m.lastindex-1],word)
+    return "".join(c for c in sounds if c in convert_dict or c in letter_forms)
+
+# look up words we haven't seen yet, a few hundred at a time so each query stays small
+# words eng_to_ipa doesn't know get guess_ipa's transcription, which is cached like any other so they're never looked up again
+def lookup_ipa(words,chunk=500):
+    out = []
+    for i in range(0,len(words),chunk):
+        out += [options[-1] for options in ipa.ipa_list(words[i:i+chunk])]
+    guesses = 0
+    for i,transcription in enumerate(out):
+        if "*" in transcription:
+            out[i] = guess_ipa(words[i])
+            guesses += 1
+    if profiling:
+        emit("ipa_guesses",guesses)
+    return out
+
+# same result as ipa.convert(string), but only words missing from ipa_cache reach the database
+def cached_ipa(string):
+    load_caches_once()
+    words = [w.lower() for w in string.split()]
+    found = {}
+    missing = []
+    for w in dict.fromkeys(words):
+        if w in ipa_cache:
+            ipa_cache.move_to_end(w)
+            found[w] = ipa_cache[w]
+        else:
+            missing.append(w)
+    if profiling:
+        emit("words_transcribed",len(words))
+        emit("ipa_cache_hits",len(found))
+        emit("ipa_lookups",len(missing))
+    for w,transcription in zip(missing,lookup_ipa(missing)):
+        found[w] = transcription
+        remember_ipa(w,transcription)
+    return " ".join(found[w] for w in words)
+
+def save_ipa_cache(path):
+    with open(path,"w",encoding="utf-8") as f:
+        json.dump(list(ipa_cache.items()),f,ensure_ascii=False)
+
+def load_ipa_cache(path):
+    if not os.path.exists(path):
+        return
+    with open(path,encoding="utf-8") as f:
+        for word,transcription in json.load(f):
+            # saved before words eng_to_ipa doesn't know were guessed
+            if "*" in transcription:
+                transcription = guess_ipa(word)
+            remember_ipa(word,transcription)
+
+# fill the cache with the top_n most frequent english words (the csv is already sorted by frequency)
+def prewarm_ipa_cache(path=one_grams_path,top_n=10000):
+    with open(path,encoding="utf-8") as f:
+        words = [row["ngram"].lower() for _,row in zip(range(top_n),csv.DictReader(f))]
+    # insert the rarest first so the most common words are the last to be evicted
+    missing = [w for w in dict.fromkeys(reversed(words)) if w.split() == [w] and w not in ipa_cache]
+    for w,transcription in zip(missing,lookup_ipa(missing)):
+        remember_ipa(w,transcription)
+
 def grafoni_spell(string):
-    ipa_string = ipa.convert(string)
+    ipa_string = cached_ipa(string)
     ipa_string = keep_some_y_w(ipa_string)
     out = []
     for letter in ipa_string:
@@ -442,24 +709,28 @@ def grafoni_spell(string):
             out += [letter]
     return out
 
+# the glyphs with beginning and ending forms, and the neighbours that stop them being used. a glyph takes its
+# beginning form after one of end_marks unless the glyph after it is one of the listed ones, and otherwise its ending
+# form before one of end_marks unless the glyph before it is one of the listed ones
+end_marks = {" ",",",".","-",";",":"}
+upper_vowels = ["uv1","uv2","uv3"]
+mid_vowels = ["mv1","mv2","mv3"]
+lower_vowels = ["lv1","lv2","lv3"]
+begin_forms = {"k":[],"g":[],"t":[],"d":[],"p":[],"b":[],"h":[],"x":[],
+               "th":upper_vowels+mid_vowels,"dh":upper_vowels+mid_vowels,"f":upper_vowels,"v":upper_vowels}
+end_forms = {"p":[],"b":[],"h":[],"x":[],"th":[],"dh":[],"f":[],"v":[],
+             "t":lower_vowels+mid_vowels,"d":lower_vowels+mid_vowels,"k":lower_vowels,"g":lower_vowels}
+
 def process_ends(in_grafoni):
     in_grafoni = [" "] + in_grafoni + [" "]
     out_grafoni = []
     for i in range(len(in_grafoni)-2):
-        # beginning
         l, m, r = in_grafoni[i:i+3]
-        if l in [" ",",",".","-",";",":"] and (m in ["k","g","t","d","p","b","h","x"]):
-            m += "-beg"
-        if l in [" ",",",".","-",";",":"] and m in ["th","dh"] and not r in ["uv1","uv2","uv3","mv1","mv2","mv3"]:
-            m += "-beg"
-        if l in [" ",",",".","-",";",":"] and m in ["f","v"] and not r in ["uv1","uv2","uv3"]:
+        # beginning
+        if l in end_marks and m in begin_forms and r not in begin_forms[m]:
             m += "-beg"
         # ending
-        if r in [" ",",",".","-",";",":"] and m in ["p","b","h","x","th","dh","f","v"]:
-            m += "-end"
-        if r in [" ",",",".","-",";",":"] and m in ["t","d"] and not l in ["lv1","lv2","lv3","mv1","mv2","mv3"]:
-            m += "-end"
-        if r in [" ",",",".","-",";",":"] and m in ["k","g"] and not l in ["lv1","lv2","lv3"]:
+        elif r in end_marks and m in end_forms and l not in end_forms[m]:
             m += "-end"
         out_grafoni.append(m)
     return out_grafoni
@@ -467,8 +738,13 @@ def process_ends(in_grafoni):
 # change last curve to be a little longer, and flat.  do nothing with negatives, but do something with non-negatives, including zero
 def r_extend(strokes,length=1):
     strokes = strokes.copy()
+    r_extend_in_place(strokes,length)
+    return strokes
+
+# same as r_extend, but only touches the last stroke of the list it is given instead of copying it
+def r_extend_in_place(strokes,length=1):
     if length < 0:
-        return strokes
+        return
     s = strokes[-1]
     if s[0] == 'move':
         strokes[-1] = ('move',s[1]+length,s[2])
@@ -478,7 +754,6 @@ def r_extend(strokes,length=1):
         strokes[-1] = ('cubic',s[1],s[2],s[3],s[4],s[3]+length,s[4])
     if s[0] == 'cubic':
         strokes[-1] = ('cubic',s[1],s[2],s[3],s[6],s[5]+length,s[6]) #note I kinda just flatten the end
-    return strokes
 
 # change first curve to be a little longer and flat, translate the rest
 # assumes you start at 0,0 (as all should)
@@ -497,22 +772,48 @@ def l_extend(strokes,length = 1):
         strokes[0] = ('cubic',s[1]+length,0,s[3]+length,s[4],s[5]+length,s[6]) #note I kinda just flatten the end
     return [strokes[0]] + translate(strokes[1:],length,0)
 
-def make_ligatures(in_list):
+# ligature names split into their parts, as a trie: part -> [children, value], where value is set on the last part of a name
+# part_id and value_of let the same trie be built over other symbols than glyph names (see glyph_tables)
+def ligature_trie(names,part_id = lambda part: part,value_of = lambda name: name):
+    trie = {}
+    for name in names:
+        children = trie
+        parts = [part_id(part) for part in name.split("_")]
+        if len(parts) < 2 or None in parts:
+            continue
+        for part in parts[:-1]:
+            children = children.setdefault(part,[{},None])[0]
+        children.setdefault(parts[-1],[{},None])[1] = value_of(name)
+    return trie
+
+# walks in_list once, replacing the longest run of symbols at each position that makes a ligature
+def match_ligatures(in_list,trie):
     out = []
-    last = "None"
-    for c in in_list:
-        potential = last + "_" + c
-        if potential in ligatures:
-            out.append(potential) 
-            last = "None"
-        else:
-            if last != "None":
-                out.append(last)
-            last = c
-    if last != "None":
-        out.append(last)
+    i = 0
+    while i < len(in_list):
+        best, end = in_list[i], i+1
+        node = trie.get(in_list[i])
+        j = i+1
+        while node is not None and j < len(in_list):
+            node = node[0].get(in_list[j])
+            j += 1
+            if node is not None and node[1] is not None:
+                best, end = node[1], j
+        out.append(best)
+        i = end
     return out
 
+# rebuilt whenever the glyph tables change
+ligature_names_state = None
+ligature_names_trie = None
+
+def make_ligatures(in_list):
+    global ligature_names_state, ligature_names_trie
+    if ligature_names_state != tables_state():
+        ligature_names_state = tables_state()
+        ligature_names_trie = ligature_trie(set(ligatures))
+    return match_ligatures(in_list,ligature_names_trie)
+
 def first(string):
     parts = string.split("_")
     if len(parts) == 0:
@@ -531,11 +832,16 @@ def v_nudge(paths,nudge_size = 0.1):
     if nudge_size < 0:
         return paths
     paths = paths.copy()
+    v_nudge_in_place(paths,nudge_size)
+    return paths
+
+def v_nudge_in_place(paths,nudge_size = 0.1):
+    if nudge_size < 0:
+        return
     last = paths[-1]
     paths+=[('quadratic',last[-2]+nudge_size,last[-1],last[-2]+nudge_size,last[-1]+nudge_size),('line',last[-2]+nudge_size,last[-1])]
-    return paths
 
-nudge_kern = defaultdict(lambda:-1)
+nudge_kern = DefaultTableDict(lambda:-1)
 nudge_kern[('mv1','mv1')] = 1
 nudge_kern[('mv2','mv1')] = 1
 nudge_kern[('mv3','mv1')] = 1
@@ -549,75 +855,779 @@ nudge_kern[('mv3','mv3')] = 1
 def to_list(in_string):
     return make_ligatures(process_ends(grafoni_spell(in_string)))
 
-def to_svg(in_string,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5):
-    chars = in_string
-    if isinstance(chars, str):
-        chars = to_list(in_string)
-    #print(" ".join(chars))
-    out = [('move',0,0)]
+# looks up kerning and nudging between two glyphs without adding the defaults to the tables
+def kern_pair(a,b):
+    key = (last(a),first(b))
+    l_kern,r_kern = kerning[key] if key in kerning else kerning.default_factory()
+    n_val = nudge_kern[key] if key in nudge_kern else nudge_kern.default_factory()
+    return l_kern,r_kern,n_val
+
+# appends the glyph l to out in place (kerned against last_char) and returns the new last_char
+# equivalent to out = concat(v_nudge(r_extend(out,l_kern),n_val),l_extend(form,r_kern)), but only the last stroke of out is ever touched, so laying out a document is linear in its length
+def place_glyph(out,last_char,l):
+    if l in letter_forms:
+        form = letter_forms[l]
+    elif l in ligatures:
+        form = ligatures[l]
+    else:
+        if profiling:
+            emit("unsupported:" + l)
+        return last_char
+    l_kern,r_kern,n_val = kern_pair(last_char,l)
+    r_extend_in_place(out,l_kern)
+    v_nudge_in_place(out,n_val)
+    last_x, last_y = out[-1][-2:]
+    out += translate(l_extend(form,r_kern),last_x,last_y)
+    return l
+
+def new_line(out,shear_val,line_space,v_scale):
+    out.append(('move',-shear_val*v_scale*(out[-1][-1]+line_space),out[-1][-1]+line_space))
+
+# starts a new line if we just wrote a space past the wrap width, returns whether it did
+def wrap_line(out,last_char,wrap,shear_val,line_space,v_scale):
+    if last_char == " "  and out[-1][-2] + shear_val*v_scale*out[-1][-1] > wrap:
+        new_line(out,shear_val,line_space,v_scale)
+        return True
+    return False
+
+# kerning and nudging are looked up in the compiled tables (see glyph_tables), by glyph id
+def layout(chars,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5):
+    out = glyph_tables.layout(chars,compiled_tables(),wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale)
+    if profiling:
+        emit("strokes",len(out))
+    return out
+
+# finished strokes of whole words, so frequent words skip spelling, ligatures and kerning
+# entries are (glyphs, strokes) where strokes are everything drawn after the pen position the word starts at,
+# assuming a space came before it, or (glyphs, None) if the word has glyphs we can't draw
+word_cache = OrderedDict()
+word_cache_size = 20000
+word_cache_state = None
+word_cache_tables = None
+
+# changes whenever anything that goes into a word outline changes
+def tables_fingerprint():
+    # defaults stored by looking up missing pairs change nothing drawn
+    kerns = [{k:v for k,v in table.items() if v != table.default_factory()} for table in (kerning,nudge_kern)]
+    tables = (convert_dict,letter_forms,ligatures,*kerns)
+    return hashlib.sha1(repr(tables).encode("utf-8")).hexdigest()
+
+# the glyph tables compiled to ids, recompiled whenever they change (see TableDict). comparing tables_state() is cheap
+# enough to do on every render, hashing the tables isn't, so that is only done for files saved and loaded
+compiled = None
+compiled_state = None
+
+def compiled_tables():
+    global compiled, compiled_state
+    state = tables_state()
+    if compiled_state != state:
+        compiled = glyph_tables.compile_tables()
+        compiled_state = state
+    return compiled
+
+def check_word_cache():
+    global word_cache_state, word_cache_tables
+    state = tables_state()
+    if word_cache_state != state:
+        word_cache.clear()
+        word_advances.clear()
+        word_reaches.clear()
+        word_cache_state = state
+        word_cache_tables = None
+
+# fingerprint of the tables the word cache was built from, worked out the first time it's needed
+def word_cache_fingerprint():
+    global word_cache_tables
+    check_word_cache()
+    if word_cache_tables is None:
+        word_cache_tables = tables_fingerprint()
+    return word_cache_tables
+
+def build_outline(glyphs):
+    if not glyphs or not all(l in letter_forms or l in ligatures for l in glyphs):
+        return None
+    tables = compiled_tables()
+    return glyph_tables.outline_ids(tables.encode(glyphs),tables)
+
+# words are transcribed this many at a time, ahead of laying them out (see prefetched)
+lookahead = 500
+
+# transcribes every word with no outline or pronunciation yet in one eng_to_ipa query, instead of one query a word
+def prefetch_ipa(words):
+    missing = [w for w in dict.fromkeys(w.lower() for w in words) if w not in word_cache and w not in ipa_cache]
+    if missing:
+        cached_ipa(" ".join(missing))
+
+# the words of any iterable unchanged, each window of them transcribed together before the first is yielded
+def prefetched(words,window = lookahead):
+    words = iter(words)
+    while True:
+        chunk = list(islice(words,window))
+        if not chunk:
+            return
+        prefetch_ipa(chunk)
+        yield from chunk
+
+# call check_word_cache() first if the glyph tables might have changed
+def word_outline(word):
+    key = word.lower()
+    if key in word_cache:
+        word_cache.move_to_end(key)
+        if profiling:
+            emit("word_cache_hits")
+        return word_cache[key]
+    if profiling:
+        emit("word_cache_misses")
+    glyphs = to_list(key)
+    entry = (glyphs,build_outline(glyphs))
+    lru_put(word_cache,key,entry,word_cache_size)
+    return entry
+
+def place_word(out,last_char,entry):
+    glyphs,strokes = entry
+    l_kern,_,n_val = kern_pair(last_char,glyphs[0])
+    r_extend_in_place(out,l_kern)
+    v_nudge_in_place(out,n_val)
+    last_x, last_y = out[-1][-2:]
+    out += translate(strokes,last_x,last_y)
+    return glyphs[-1]
+
+# lays out words (any iterable of them) built from word_cache, yielding the strokes of each line as soon as it wraps
+# every line starts with the move to where it begins, so joining them gives the strokes of the whole text
+# if placements is a dict, every word drawn from its cached outline is recorded in it as
+# id(first stroke) -> (word, first stroke, last stroke, outline strokes), see svgWordStrokes
+# origin is the move the first line starts with, and if starts is a list, the index of the first word drawn on each line
+# is appended to it just before the line is yielded (-1 for a line that starts partway through a word)
+# if breaks is given (a set of word indices, see break_lines), lines start at exactly those words and wrap is ignored
+# if spans is a list, (first stroke, end stroke) of every word is appended to it, counting strokes along all the lines joined
+def layout_lines(words,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,placements=None,origin=('move',0,0),starts=None,breaks=None,spans=None):
+    load_caches_once()
+    check_word_cache()
+    out = [origin]
     last_char = " "
-    for l in chars:
-        if l in letter_forms:
-            l_kern,r_kern = kerning[(last(last_char),first(l))]
-            n_val = nudge_kern[(last(last_char),first(l))]
-            last_char = l
-            out = concat(v_nudge(r_extend(out,l_kern),n_val),l_extend(letter_forms[l],r_kern))
-        elif l in ligatures:
-            l_kern,r_kern = kerning[(last(last_char),first(l))]
-            n_val = nudge_kern[(last(last_char),first(l))]
-            last_char = l
-            out = concat(v_nudge(r_extend(out,l_kern),n_val),l_extend(ligatures[l],r_kern))
+    line_start = 0
+    # strokes in the lines already yielded
+    done = 0
+    for i,word in enumerate(prefetched(words)):
+        if i > 0:
+            last_char = place_glyph(out,last_char," ")
+            if breaks is None:
+                wrapped = wrap_line(out,last_char,wrap,shear_val,line_space,v_scale)
+            elif i in breaks:
+                new_line(out,shear_val,line_space,v_scale)
+                wrapped = True
+            else:
+                wrapped = False
+            if wrapped:
+                if profiling:
+                    emit("strokes",len(out)-1)
+                if starts is not None:
+                    starts.append(line_start)
+                yield out[:-1]
+                done += len(out)-1
+                out = out[-1:]
+                line_start = i
+        word_start = done + len(out)
+        glyphs,strokes = word_outline(word)
+        if strokes is not None and last_char == " ":
+            last_char = place_word(out,last_char,(glyphs,strokes))
+            if placements is not None:
+                start = out[-len(strokes)]
+                placements[id(start)] = (word.lower(),start,out[-1],strokes)
         else:
-            print("Unsupported Character: " + l)
-        if last_char == " "  and out[-1][-2] + shear_val*v_scale*out[-1][-1] > wrap:
-            out.append(('move',-shear_val*v_scale*(out[-1][-1]+line_space),out[-1][-1]+line_space))
-    return display(svgStrokes(shear(scale(out,1,v_scale),by=shear_val)))
+            for l in glyphs:
+                last_char = place_glyph(out,last_char,l)
+                if breaks is None and wrap_line(out,last_char,wrap,shear_val,line_space,v_scale):
+                    if profiling:
+                        emit("strokes",len(out)-1)
+                    if starts is not None:
+                        starts.append(line_start)
+                    yield out[:-1]
+                    done += len(out)-1
+                    out = out[-1:]
+                    line_start = -1
+        if spans is not None:
+            spans.append((word_start,done+len(out)))
+    if profiling:
+        emit("strokes",len(out))
+    if starts is not None:
+        starts.append(line_start)
+    yield out
+
+# same strokes as layout(to_list(in_string)), but built a word at a time from word_cache
+# with mode "greedy" or "optimal" the lines are broken first from the measured word widths (see break_lines).
+# greedy gives the same lines as the default, except that a line ending within rounding error of wrap can go either way
+def layout_text(in_string,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,mode=None):
+    words = in_string.split()
+    breaks = None if mode is None else set(break_lines(words,wrap,shear_val,v_scale,mode))
+    out = []
+    for line in layout_lines(words,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale,breaks=breaks):
+        out += line
+    return out
+
+# how far every word moves the pen, so lines can be broken on numbers alone before any strokes are placed.
+# a word always starts after a space (or at the start of a line, which is laid out the same way) and kerning never
+# crosses a space, so this only depends on the word. entries are (dx, dy) of the word alone and (dx, dy) with the space
+# after it, and are thrown away with word_cache when the glyph tables change
+word_advances = {}
+
+def word_advance(word):
+    key = word.lower()
+    if key in word_advances:
+        return word_advances[key]
+    out,last_char = place_alone(word)
+    alone = out[-1][-2:]
+    place_glyph(out,last_char," ")
+    word_advances[key] = (alone[0],alone[1],out[-1][-2],out[-1][-1])
+    return word_advances[key]
+
+# the strokes of word laid out on its own from the origin, as layout_lines draws it, and its last glyph
+def place_alone(word):
+    glyphs,strokes = word_outline(word)
+    out = [('move',0,0)]
+    last_char = " "
+    if strokes is not None:
+        last_char = place_word(out,last_char,(glyphs,strokes))
+    else:
+        for l in glyphs:
+            if l in letter_forms or l in ligatures:
+                last_char = place_glyph(out,last_char,l)
+    return out,last_char
+
+# how far right of where it starts the ink of word reaches after transform, with or without the space after it
+# (the space can stretch the word's last stroke). cleared with word_advances
+word_reaches = {}
+
+def word_reach(word,transform):
+    key = (word.lower(),transform)
+    if key not in word_reaches:
+        out,last_char = place_alone(word)
+        reach = exact_bounding_box(out,transform)[2]
+        place_glyph(out,last_char," ")
+        word_reaches[key] = max(reach,exact_bounding_box(out,transform)[2])
+    return word_reaches[key]
+
+# sheared widths of every word on its own and with the space after it, which is what wrap is measured against
+def measure_words(words,shear_val=-1/sqrt(3),v_scale=0.5):
+    load_caches_once()
+    check_word_cache()
+    s = shear_val*v_scale
+    widths = []
+    advances = []
+    for word in prefetched(words):
+        dx,dy,full_dx,full_dy = word_advance(word)
+        widths.append(dx + s*dy)
+        advances.append(full_dx + s*full_dy)
+    return widths, advances
+
+# the index of the word each line after the first starts with
+# greedy breaks after the first space past wrap, like layout_lines does, so its lines can reach past wrap by one word.
+# optimal keeps every line (other than a single word too wide for any line) within wrap and minimises the sum of the
+# squared room left at the end of each line but the last, the Knuth-Plass minimum raggedness rule
+def break_lines(words,wrap = 100,shear_val=-1/sqrt(3),v_scale=0.5,mode="greedy"):
+    widths,advances = measure_words(words,shear_val,v_scale)
+    if mode == "greedy":
+        return break_greedy(advances,wrap)
+    if mode == "optimal":
+        return break_optimal(widths,advances,wrap)
+    raise ValueError("unknown line breaking mode " + repr(mode))
+
+def break_greedy(advances,wrap):
+    breaks = []
+    x = 0
+    for i,advance in enumerate(advances[:-1]):
+        x += advance
+        if x > wrap:
+            breaks.append(i+1)
+            x = 0
+    return breaks
+
+def break_optimal(widths,advances,wrap):
+    n = len(widths)
+    # ends[i] is the x the pen reaches after word i-1 and its space, from the start of the text
+    ends = [0]
+    for advance in advances:
+        ends.append(ends[-1] + advance)
+    cost = [0] + [float("inf")]*n
+    previous = [0]*(n+1)
+    for j in range(1,n+1):
+        for i in range(j-1,-1,-1):
+            width = ends[j-1] - ends[i] + widths[j-1]
+            if width > wrap and i < j-1:
+                break
+            line_cost = 0 if j == n else max(wrap-width,0)**2
+            if cost[i] + line_cost < cost[j]:
+                cost[j] = cost[i] + line_cost
+                previous[j] = i
+    breaks = []
+    j = n
+    while j > 0:
+        j = previous[j]
+        if j > 0:
+            breaks.append(j)
+    return breaks[::-1]
+
+# exact boxes (see exact_bounding_box) of in_string laid out as layout_text does, after transform, which is the one
+# to_svg draws with if not given. returns (strokes, box of everything, box of every line, box of every word), where
+# line and word boxes are (n,4) arrays of min_x, min_y, max_x, max_y rows, inf, inf, -inf, -inf for anything with nothing drawn
+def text_boxes(in_string,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,transform=None):
+    if transform is None:
+        transform = compose(scale_matrix(1,v_scale),shear_matrix(shear_val))
+    spans = []
+    lines = list(layout_lines(in_string.split(),wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale,spans=spans))
+    strokes = [stroke for line in lines for stroke in line]
+    boxes = stroke_boxes(strokes,transform)
+    ends = [0]
+    for line in lines:
+        ends.append(ends[-1] + len(line))
+    line_boxes = packed_strokes.range_boxes(boxes,list(zip(ends,ends[1:])))
+    return strokes, packed_strokes.box_of(boxes), line_boxes, packed_strokes.range_boxes(boxes,spans)
+
+# words from a string, a file object or any other iterable of strings, without reading it all in at once
+def iter_words(source):
+    if isinstance(source,str):
+        source = [source]
+    for chunk in source:
+        yield from chunk.split()
+
+def save_word_cache(path):
+    fingerprint = word_cache_fingerprint()
+    with open(path,"w",encoding="utf-8") as f:
+        json.dump({"tables":fingerprint,"words":[[word,glyphs,strokes] for word,(glyphs,strokes) in word_cache.items()]},f,ensure_ascii=False)
+
+# entries built from different glyph tables are ignored
+def load_word_cache(path):
+    check_word_cache()
+    if not os.path.exists(path):
+        return
+    with open(path,encoding="utf-8") as f:
+        saved = json.load(f)
+    if saved["tables"] != word_cache_fingerprint():
+        return
+    for word,glyphs,strokes in saved["words"]:
+        if strokes is not None:
+            strokes = [tuple(s) for s in strokes]
+        lru_put(word_cache,word,(glyphs,strokes),word_cache_size)
+
+# precompile the outlines of the top_n most frequent english words into an artifact load_word_cache can read
+def build_word_cache(path,top_n=5000,csv_path=one_grams_path):
+    check_word_cache()
+    prewarm_ipa_cache(csv_path,top_n)
+    with open(csv_path,encoding="utf-8") as f:
+        words = [row["ngram"] for _,row in zip(range(top_n),csv.DictReader(f))]
+    for word in reversed(words):
+        if word.split() == [word]:
+            word_outline(word)
+    save_word_cache(path)
+
+def layout_any(in_string,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5):
+    if isinstance(in_string, str):
+        return layout_text(in_string,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale)
+    return layout(in_string,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale)
+
+# if cache_dir is set (or GRAFONI_CACHE_DIR), the pronunciation and word caches saved there by save_caches
+# are read in the first time either cache is needed, rather than when grafoni is imported
+cache_dir = os.environ.get("GRAFONI_CACHE_DIR")
+caches_loaded = False
+
+def load_caches_once():
+    global caches_loaded
+    if caches_loaded or not cache_dir:
+        return
+    caches_loaded = True
+    load_ipa_cache(os.path.join(cache_dir,"ipa_cache.json"))
+    load_word_cache(os.path.join(cache_dir,"word_cache.json"))
+
+def save_caches(directory=None):
+    directory = directory or cache_dir
+    os.makedirs(directory,exist_ok=True)
+    save_ipa_cache(os.path.join(directory,"ipa_cache.json"))
+    save_word_cache(os.path.join(directory,"word_cache.json"))
+
+# with dedup, every distinct word is written once and placed with <use>, which makes text with many repeated words much smaller
+def to_drawing(in_string,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,dedup=False,precision=None,relative=False):
+    transform = compose(scale_matrix(1,v_scale),shear_matrix(shear_val))
+    if isinstance(in_string, str) and dedup:
+        placements = {}
+        out = []
+        for line in layout_lines(in_string.split(),wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale,placements=placements):
+            out += line
+        return svgWordStrokes(out,placements,transform=transform,precision=precision,relative=relative)
+    out = layout_any(in_string,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale)
+    return svgStrokes(out,transform=transform,precision=precision,relative=relative)
+
+# svg text straight from the layout, skipping drawsvg entirely (see svgStrokesText)
+def to_svg_text(in_string,out=None,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,precision=None,relative=False):
+    strokes = layout_any(in_string,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale)
+    return svgStrokesText(strokes,out,transform=compose(scale_matrix(1,v_scale),shear_matrix(shear_val)),precision=precision,relative=relative)
+
+# utf-8 svg bytes, written to the binary stream out if given and returned otherwise
+def to_svg_bytes(in_string,out=None,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,precision=None,relative=False):
+    if out is None:
+        return to_svg_text(in_string,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale,precision=precision,relative=relative).encode("utf-8")
+    text_out = io.TextIOWrapper(out,encoding="utf-8",newline="",write_through=True)
+    try:
+        to_svg_text(in_string,text_out,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale,precision=precision,relative=relative)
+    finally:
+        text_out.detach()
+
+# the drawsvg drawing, for saving with save_svg, as_svg() or showing in a notebook (see show). nothing here needs IPython
+def to_svg(in_string,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,dedup=False,precision=None,relative=False):
+    return to_drawing(in_string,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale,dedup=dedup,precision=precision,relative=relative)
+
+# displays the drawing in a jupyter notebook, the only place grafoni imports IPython
+def show(in_string,**options):
+    from IPython.display import display
+    return display(to_svg(in_string,**options))
+
+# runs once in every worker process, so the caches and the eng_to_ipa database are ready before the first chunk
+def init_render_worker(ipa_cache_file=None,word_cache_file=None):
+    if ipa_cache_file:
+        load_ipa_cache(ipa_cache_file)
+    if word_cache_file:
+        load_word_cache(word_cache_file)
+    check_word_cache()
+    cached_ipa("the")
+
+def render_chunk(texts,options):
+    options = dict(options)
+    if options.pop("dedup",False):
+        return [to_drawing(text,dedup=True,**options).as_svg() for text in texts]
+    return [to_svg_text(text,**options) for text in texts]
+
+# f applied to every item of tasks across a pool of worker processes started with init_render_worker, results yielded
+# in input order. only a couple of tasks per worker are in flight at once, so tasks can be any iterable, however long
+def pool_map(f,tasks,workers=None,ipa_cache_file=None,word_cache_file=None):
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        init_render_worker(ipa_cache_file,word_cache_file)
+        yield from map(f,tasks)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    pool = ProcessPoolExecutor(workers,initializer=init_render_worker,initargs=(ipa_cache_file,word_cache_file))
+    try:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(f,task))
+            if len(pending) >= 2*workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+# renders texts to svg strings across a process pool, yielding them in input order
+# texts are sent in chunks of chunksize, so any iterable works
+def iter_render(texts,workers=None,chunksize=16,ipa_cache_file=None,word_cache_file=None,**options):
+    texts = iter(texts)
+    chunks = iter(lambda: list(islice(texts,chunksize)),[])
+    for svgs in pool_map(partial(render_chunk,options=options),chunks,workers,ipa_cache_file,word_cache_file):
+        yield from svgs
 
-def bounding_box(strokes):
+def render_many(texts,workers=None,chunksize=16,ipa_cache_file=None,word_cache_file=None,**options):
+    return list(iter_render(texts,workers,chunksize,ipa_cache_file,word_cache_file,**options))
+
+# 2d affine transforms are kept as (a,b,c,d,e,f) in the same order svg uses: x' = a*x + c*y + e, y' = b*x + d*y + f
+identity = (1,0,0,1,0,0)
+
+def translate_matrix(dx,dy):
+    return (1,0,0,1,dx,dy)
+
+def scale_matrix(dx,dy):
+    return (dx,0,0,dy,0,0)
+
+def shear_matrix(by=-1):
+    return (1,0,by,1,0,0)
+
+# the transform that does m first and then n
+def compose(m,n):
+    a1,b1,c1,d1,e1,f1 = m
+    a2,b2,c2,d2,e2,f2 = n
+    return (a2*a1+c2*b1, b2*a1+d2*b1, a2*c1+c2*d1, b2*c1+d2*d1, a2*e1+c2*f1+e2, b2*e1+d2*f1+f2)
+
+def transform_points(m,coords):
+    a,b,c,d,e,f = m
+    out = []
+    for i in range(0,len(coords),2):
+        x,y = coords[i],coords[i+1]
+        out += [a*x+c*y+e,b*x+d*y+f]
+    return out
+
+def transform(strokes,m):
+    return [(s[0],*transform_points(m,s[1:])) for s in strokes]
+
+# box around the control points (and the origin) after applying transform
+def bounding_box(strokes,transform=identity):
+    a,b,c,d,e,f = transform
     min_x = 0
     min_y = 0
     max_x = 0
     max_y = 0
     for stroke in strokes:
-        if stroke[0] == 'move':
-            min_x = min(min_x,stroke[1])
-            min_y = min(min_y,stroke[2])
-            max_x = max(max_x,stroke[1])
-            max_y = max(max_y,stroke[2])
-        if stroke[0] == 'line':
-            min_x = min(min_x,stroke[1])
-            min_y = min(min_y,stroke[2])
-            max_x = max(max_x,stroke[1])
-            max_y = max(max_y,stroke[2])
-        if stroke[0] == 'quadratic':
-            min_x = min(min_x,stroke[1],stroke[3])
-            min_y = min(min_y,stroke[2],stroke[4])
-            max_x = max(max_x,stroke[1],stroke[3])
-            max_y = max(max_y,stroke[2],stroke[4])
-        if stroke[0] == 'cubic':
-            min_x = min(min_x,stroke[1],stroke[3],stroke[5])
-            min_y = min(min_y,stroke[2],stroke[4],stroke[6])
-            max_x = max(max_x,stroke[1],stroke[3],stroke[5])
-            max_y = max(max_y,stroke[2],stroke[4],stroke[6])
+        for i in range(1,len(stroke),2):
+            x = a*stroke[i]+c*stroke[i+1]+e
+            y = b*stroke[i]+d*stroke[i+1]+f
+            min_x = min(min_x,x)
+            min_y = min(min_y,y)
+            max_x = max(max_x,x)
+            max_y = max(max_y,y)
     return min_x, min_y, max_x, max_y
 
-def svgStrokes(strokes, scale = 4,padding = 1, stroke_width = 1.0/3):
-    path = draw.Path(stroke='black', fill='none', stroke_width = stroke_width*scale, stroke_linecap='round', stroke_linejoin='round')
-    min_x,min_y,max_x,max_y = bounding_box(strokes)
+# exact box of every stroke after transform as drawn, see packed_strokes.PackedStrokes.stroke_boxes
+def stroke_boxes(strokes,transform=identity):
+    packed = packed_strokes.pack(strokes)
+    if transform != identity:
+        packed = packed.transform(transform)
+    return packed.stroke_boxes(transform[4:])
+
+# tighter than bounding_box: curves count where they actually reach rather than where their control points are,
+# and only what is drawn counts, so moves and the origin on their own don't stretch the box
+def exact_bounding_box(strokes,transform=identity):
+    return packed_strokes.box_of(stroke_boxes(strokes,transform))
+
+def format_number(v,precision=None):
+    if precision is None:
+        text = repr(float(v))
+        return text[:-2] if text.endswith(".0") else text
+    text = "%.*f" % (precision,v)
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+def path_command(letter,numbers):
+    out = letter
+    for i,n in enumerate(numbers):
+        if i > 0 and n[0] != "-":
+            out += " "
+        out += n
+    return out
+
+path_letters = {'move':'M','line':'L','quadratic':'Q','cubic':'C'}
+
+# svg path data for strokes after transform, written straight to the text stream out if given and returned as a string otherwise
+# precision rounds to that many decimals, relative writes lowercase commands measured from the current point
+# moves are only written once something is drawn after them, so runs of moves and moves to where the pen already is disappear
+def path_data(strokes,transform = identity,precision = None,relative = False,out = None):
+    parts = []
+    write = out.write if out is not None else parts.append
+    cur = [0,0]
+    pending = transform_points(transform,[0,0])
+    started = False
     for stroke in strokes:
+        coords = transform_points(transform,stroke[1:])
+        if precision is not None:
+            coords = [round(v,precision) for v in coords]
         if stroke[0] == 'move':
-            path.M(scale*(stroke[1]-min_x)+scale*padding,scale*(stroke[2]-min_y)+scale*padding)
-        if stroke[0] == 'line':
-            path.L(scale*(stroke[1]-min_x)+scale*padding,scale*(stroke[2]-min_y)+scale*padding)
-        if stroke[0] == 'quadratic':
-            path.Q(scale*(stroke[1]-min_x)+scale*padding,scale*(stroke[2]-min_y)+scale*padding,scale*(stroke[3]-min_x)+scale*padding,scale*(stroke[4]-min_y)+scale*padding)
-        if stroke[0] == 'cubic':
-            path.C(scale*(stroke[1]-min_x)+scale*padding,scale*(stroke[2]-min_y)+scale*padding,scale*(stroke[3]-min_x)+scale*padding,scale*(stroke[4]-min_y)+scale*padding,scale*(stroke[5]-min_x)+scale*padding,scale*(stroke[6]-min_y)+scale*padding)
-    
+            pending = coords
+            continue
+        if pending is not None:
+            if not started or pending != cur:
+                move = [pending[0]-cur[0],pending[1]-cur[1]] if relative else pending
+                write(path_command('m' if relative else 'M',[format_number(v,precision) for v in move]))
+                started = True
+            cur = pending
+            pending = None
+        letter = path_letters[stroke[0]]
+        if relative:
+            numbers = [format_number(v-cur[i%2],precision) for i,v in enumerate(coords)]
+            letter = letter.lower()
+        else:
+            numbers = [format_number(v,precision) for v in coords]
+        write(path_command(letter,numbers))
+        cur = coords[-2:]
+    if out is None:
+        return "".join(parts)
+
+# transform is applied to the strokes together with the pixel scale and padding, in one pass while the path is written
+def svgStrokes(strokes, scale = 4,padding = 1, stroke_width = 1.0/3, transform = identity, precision = None, relative = False):
+    min_x,min_y,max_x,max_y = exact_bounding_box(strokes,transform)
+    to_pixels = compose(transform,(scale,0,0,scale,scale*(padding-min_x),scale*(padding-min_y)))
+    path = draw.Path(d=path_data(strokes,to_pixels,precision,relative),stroke='black', fill='none', stroke_width = stroke_width*scale, stroke_linecap='round', stroke_linejoin='round')
+
     d = draw.Drawing(scale*(max_x-min_x)+2*scale*padding,scale*(max_y-min_y)+2*scale*padding)
     d.append(draw.Use(path,0,0))
     return d
 
+svg_header = '<?xml version="1.0" encoding="UTF-8"?>\n<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"'
+
+# the same picture as svgStrokes, written as svg text without building any drawsvg objects
+# goes to the text stream out if given, and is returned as a string otherwise
+def svgStrokesText(strokes, out = None, scale = 4,padding = 1, stroke_width = 1.0/3, transform = identity, precision = None, relative = False):
+    if out is None:
+        out = io.StringIO()
+        svgStrokesText(strokes,out,scale,padding,stroke_width,transform,precision,relative)
+        return out.getvalue()
+    if profiling:
+        out = CountingWriter(out)
+    min_x,min_y,max_x,max_y = exact_bounding_box(strokes,transform)
+    to_pixels = compose(transform,(scale,0,0,scale,scale*(padding-min_x),scale*(padding-min_y)))
+    width = format_number(scale*(max_x-min_x)+2*scale*padding,precision)
+    height = format_number(scale*(max_y-min_y)+2*scale*padding,precision)
+    out.write(svg_header + ' width="%s" height="%s" viewBox="0 0 %s %s">\n<path d="' % (width,height,width,height))
+    path_data(strokes,to_pixels,precision,relative,out)
+    out.write('" stroke="black" fill="none" stroke-width="%s" stroke-linecap="round" stroke-linejoin="round" />\n</svg>\n' % format_number(stroke_width*scale,precision))
+    if profiling:
+        emit("bytes_written",out.count)
+
+# like svgStrokes, but words recorded in placements (see layout_lines) are drawn once in <defs> and placed with <use>
+# outlines are the same wherever a word lands, so only the linear part of the transform goes into the definition
+# a word whose last stroke was changed after it was placed (kerned against what followed) is written out in full, and so
+# is a word that is cheaper written out every time than defined once and referenced
+# the style is set once on a <g> around everything
+use_text = '<use xlink:href="#d000" x="%s" y="%s" />\n'
+def_text = '<path d="" id="d000" />\n'
+
+def svgWordStrokes(strokes, placements, scale = 4,padding = 1, stroke_width = 1.0/3, transform = identity, precision = None, relative = False):
+    min_x,min_y,max_x,max_y = exact_bounding_box(strokes,transform)
+    to_pixels = compose(transform,(scale,0,0,scale,scale*(padding-min_x),scale*(padding-min_y)))
+    linear = to_pixels[:4] + (0,0)
+    # (index of the first stroke, word, outline, where it's placed in pixels) of every word still drawn as it was placed
+    found = []
+    # bytes of all the <use> a word would need, and of writing it out in full every time instead
+    uses = defaultdict(int)
+    inline = defaultdict(int)
+    i = 0
+    while i < len(strokes):
+        placed = placements.get(id(strokes[i]))
+        if placed is not None and placed[1] is strokes[i] and i+len(placed[3]) <= len(strokes) and strokes[i+len(placed[3])-1] is placed[2]:
+            word,_,_,outline = placed
+            pen = strokes[i-1][-2:] if i > 0 else (0,0)
+            x,y = transform_points(to_pixels,pen)
+            if precision is not None:
+                x,y = round(x,precision),round(y,precision)
+            found.append((i,word,outline,(x,y)))
+            uses[word] += len(use_text % (x,y))
+            inline[word] += len(path_data([('move',*pen)]+strokes[i:i+len(outline)],to_pixels,precision,relative))
+            i += len(outline)
+        else:
+            i += 1
+    outlines = {}
+    for _,word,outline,_ in found:
+        if word not in outlines:
+            outlines[word] = path_data([('move',0,0)]+outline,linear,precision,relative)
+    defined = {word for word,data in outlines.items() if inline[word] > len(data) + len(def_text) + uses[word]}
+    d = draw.Drawing(scale*(max_x-min_x)+2*scale*padding,scale*(max_y-min_y)+2*scale*padding)
+    group = draw.Group(stroke='black', fill='none', stroke_width = stroke_width*scale, stroke_linecap='round', stroke_linejoin='round')
+    words = {}
+    rest = []
+    i = 0
+    for start,word,outline,(x,y) in found:
+        if word not in defined:
+            continue
+        rest += strokes[i:start]
+        if word not in words:
+            words[word] = draw.Path(d=outlines[word])
+        group.append(draw.Use(words[word],x,y))
+        rest.append(('move',*strokes[start+len(outline)-1][-2:]))
+        i = start + len(outline)
+    rest += strokes[i:]
+    data = path_data(rest,to_pixels,precision,relative)
+    if data:
+        group.append(draw.Path(d=data))
+    d.append(group)
+    return d
+
+# box around every glyph drawn on its own at the origin, which is how far a line can reach around its start
+def glyph_extents(transform=identity):
+    boxes = [exact_bounding_box(form,transform) for form in list(letter_forms.values())+list(ligatures.values())]
+    return min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)
+
+# writes the svg for text coming from source (see iter_words) to the text stream out, one <path> per line as soon as the line wraps
+# only the current line is kept in memory. since the size of the picture is only known at the end, it is filled in
+# by seeking back to the header when out is seekable. a pipe or socket can't be sought, so then the header gives the
+# width lines wrap at (plus the widest glyph), no height, and overflow="visible" so the word that crosses wrap and the
+# lines below aren't clipped. give out a file, or fix the size afterwards, where the exact size matters
+def stream_svg(source,out,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,scale = 4,padding = 1,stroke_width = 1.0/3,precision = None,relative = False):
+    transform = compose(scale_matrix(1,v_scale),shear_matrix(shear_val))
+    min_x,min_y,max_x,_ = glyph_extents(transform)
+    to_pixels = compose(transform,(scale,0,0,scale,scale*(padding-min_x),scale*(padding-min_y)))
+    if profiling:
+        out = CountingWriter(out)
+    seekable = out.seekable()
+    header_size = len(svg_header) + 120
+    if seekable:
+        start = out.tell()
+        out.write((svg_header + ">").ljust(header_size) + "\n")
+    else:
+        out.write(svg_header + ' width="%s" overflow="visible">\n' % (scale*(wrap + max_x - min_x + 2*padding)))
+    out.write('<g stroke="black" fill="none" stroke-width="%s" stroke-linecap="round" stroke-linejoin="round">\n' % (stroke_width*scale))
+    width = height = 0
+    for line in layout_lines(iter_words(source),wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale):
+        out.write('<path d="')
+        path_data(line,to_pixels,precision,relative,out)
+        out.write('" />\n')
+        _,_,max_x,max_y = exact_bounding_box(line,to_pixels)
+        width = max(width,max_x+scale*padding)
+        height = max(height,max_y+scale*padding)
+    out.write('</g>\n</svg>\n')
+    if profiling:
+        emit("bytes_written",out.count)
+    if seekable:
+        header = svg_header + ' width="%s" height="%s" viewBox="0 0 %s %s">' % (width,height,width,height)
+        if len(header) <= header_size:
+            end = out.tell()
+            out.seek(start)
+            out.write(header.ljust(header_size))
+            out.seek(end)
+    return width, height
+
+# splits the text from source (see iter_words) into fixed size pages, yielding each page's drawing as soon as it fills
+# sizes are in pixels. if wrap isn't given, lines are broken before any word whose ink would cross into the right
+# margin (see fit_breaks), otherwise they wrap once a space goes past wrap, like layout_lines
+def iter_pages(source,page_width = 816,page_height = 1056,margin = 48,wrap = None,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,scale = 4,stroke_width = 1.0/3,precision = None,relative = False):
+    transform = compose(scale_matrix(1,v_scale),shear_matrix(shear_val))
+    min_x,min_y,max_x,max_y = glyph_extents(transform)
+    words = iter_words(source)
+    breaks = None
+    if wrap is None:
+        # page_drawing puts min_x at the left margin, and half the stroke reaches past the ink's outline
+        room = (page_width-2*margin)/scale + min_x - stroke_width/2
+        breaks = set()
+        words = fit_breaks(words,room,transform,breaks,shear_val,v_scale)
+    lines_per_page = max(1,int(((page_height-2*margin)/scale - (max_y-min_y))//(line_space*v_scale))+1)
+    page = []
+    for line in layout_lines(words,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale,breaks=breaks):
+        page.append(line)
+        if len(page) == lines_per_page:
+            yield page_drawing(page,transform,page_width,page_height,margin,scale,stroke_width,precision,relative)
+            page = []
+    if page:
+        yield page_drawing(page,transform,page_width,page_height,margin,scale,stroke_width,precision,relative)
+
+# the words of any iterable unchanged, adding to breaks (see layout_lines) the index of every word that would reach
+# past room (in transformed x from the start of its line) before it is yielded, so lines can be broken as they stream.
+# a word too wide for any line still gets a line of its own
+def fit_breaks(words,room,transform,breaks,shear_val=-1/sqrt(3),v_scale=0.5):
+    check_word_cache()
+    s = shear_val*v_scale
+    x = 0
+    for i,word in enumerate(prefetched(words)):
+        if i > 0 and x + word_reach(word,transform) > room:
+            breaks.add(i)
+            x = 0
+        yield word
+        _,_,full_dx,full_dy = word_advance(word)
+        x += full_dx + s*full_dy
+
+# lines are moved up so the first one sits at the top margin
+def page_drawing(lines,transform,page_width,page_height,margin,scale,stroke_width,precision = None,relative = False):
+    min_x,min_y,_,_ = glyph_extents(transform)
+    top = transform_points(transform,lines[0][0][1:])[1]
+    to_pixels = compose(transform,(scale,0,0,scale,margin-scale*min_x,margin-scale*(min_y+top)))
+    d = draw.Drawing(page_width,page_height)
+    d.append(draw.Path(d=path_data([stroke for line in lines for stroke in line],to_pixels,precision,relative),stroke='black', fill='none', stroke_width = stroke_width*scale, stroke_linecap='round', stroke_linejoin='round'))
+    return d
+
+# writes every page to its own file named by filling the page number into path_pattern, returns the file names
+def write_pages(source,path_pattern = "page_%03d.svg",**options):
+    paths = []
+    for i,page in enumerate(iter_pages(source,**options)):
+        paths.append(path_pattern % (i+1))
+        page.save_svg(paths[-1])
+        if profiling:
+            emit("bytes_written",os.path.getsize(paths[-1]))
+    return paths
+
 def translate(strokes,dx,dy):
     out = []
     for s in strokes:
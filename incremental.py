@@ -0,0 +1,108 @@
+from math import sqrt
+import grafoni
+
+# keeps the layout of a text between edits, so a live preview only redoes what an edit can reach.
+# words are separated by spaces and kerning never crosses a space, so a line depends only on where it starts and the
+# words from its first one on. after an edit, layout restarts at the line holding the word before the first changed one
+# (its last stroke is kerned against the space that follows it) and stops as soon as a new line starts at an old
+# line's position with the same words after it, from where the old lines are kept as they are.
+# word outlines come from grafoni.word_cache, so only new words are transcribed
+class IncrementalRenderer:
+    def __init__(self,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,scale = 4,padding = 1,stroke_width = 1.0/3,precision = None,relative = False):
+        self.options = dict(wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale)
+        self.scale = scale
+        self.padding = padding
+        self.stroke_width = stroke_width
+        self.precision = precision
+        self.relative = relative
+        transform = grafoni.compose(grafoni.scale_matrix(1,v_scale),grafoni.shear_matrix(shear_val))
+        min_x,min_y,_,_ = grafoni.glyph_extents(transform)
+        # same pixel placement as grafoni.stream_svg, which doesn't depend on the text
+        self.to_pixels = grafoni.compose(transform,(scale,0,0,scale,scale*(padding-min_x),scale*(padding-min_y)))
+        self.tables = None
+        self.words = []
+        # per line: its strokes, the index of its first word (-1 if it starts partway through one), its svg path data
+        # and the far corner of its box in pixels
+        self.lines = []
+        self.starts = []
+        self.paths = []
+        self.corners = []
+
+    def __repr__(self):
+        return "IncrementalRenderer(%d words, %d lines)" % (len(self.words),len(self.lines))
+
+    # index of the last line starting at or before word i
+    def line_of(self,i):
+        for n in range(len(self.lines)-1,0,-1):
+            if 0 <= self.starts[n] <= i:
+                return n
+        return 0
+
+    # lays out text, reusing whatever the last update left that the edit didn't reach
+    # returns (first, removed, paths): lines first to first+removed of the old layout were replaced by the lines
+    # whose svg path data is paths, and every other line is unchanged
+    def update(self,text):
+        words = text.split()
+        if grafoni.tables_state() != self.tables:
+            self.tables = grafoni.tables_state()
+            self.words, self.lines, self.starts, self.paths, self.corners = [], [], [], [], []
+        old = self.words
+        n = min(len(old),len(words))
+        prefix = 0
+        while prefix < n and old[prefix] == words[prefix]:
+            prefix += 1
+        if self.lines and prefix == len(old) == len(words):
+            return len(self.lines), 0, []
+        suffix = 0
+        while suffix < n-prefix and old[-1-suffix] == words[-1-suffix]:
+            suffix += 1
+        delta = len(words) - len(old)
+        # from here on the new words are the old ones moved along by delta
+        changed_end = len(words) - suffix
+
+        first = self.line_of(max(prefix-1,0))
+        origin = self.lines[first][0] if self.lines else ('move',0,0)
+        begin = self.starts[first] if self.lines else 0
+        resync = {self.starts[i]:i for i in range(first+1,len(self.lines)) if self.starts[i] >= changed_end-delta}
+        tail = len(self.lines)
+        lines = []
+        starts = []
+        for line in grafoni.layout_lines(words[begin:],origin=origin,starts=starts,**self.options):
+            start = starts[-1] + begin if starts[-1] >= 0 else -1
+            if start >= changed_end and start-delta in resync and self.lines[resync[start-delta]][0] == line[0]:
+                tail = resync[start-delta]
+                starts.pop()
+                break
+            lines.append(line)
+        starts = [s + begin if s >= 0 else -1 for s in starts]
+
+        paths = [grafoni.path_data(line,self.to_pixels,self.precision,self.relative) for line in lines]
+        removed = tail - first
+        self.lines[first:tail] = lines
+        self.starts[first:tail] = starts
+        self.paths[first:tail] = paths
+        self.corners[first:tail] = [grafoni.exact_bounding_box(line,self.to_pixels)[2:] for line in lines]
+        if delta:
+            for i in range(first+len(lines),len(self.starts)):
+                if self.starts[i] >= 0:
+                    self.starts[i] += delta
+        self.words = words
+        return first, removed, paths
+
+    # strokes of the whole text, the same as grafoni.layout_text gives
+    def strokes(self):
+        return [stroke for line in self.lines for stroke in line]
+
+    def size(self):
+        width = max([x for x,_ in self.corners],default=0) + self.scale*self.padding
+        height = max([y for _,y in self.corners],default=0) + self.scale*self.padding
+        return width, height
+
+    # the whole picture as svg text, one <path> per line like grafoni.stream_svg
+    def svg(self):
+        width,height = self.size()
+        out = [grafoni.svg_header + ' width="%s" height="%s" viewBox="0 0 %s %s">\n' % (width,height,width,height)]
+        out.append('<g stroke="black" fill="none" stroke-width="%s" stroke-linecap="round" stroke-linejoin="round">\n' % (self.stroke_width*self.scale))
+        out += ['<path d="%s" />\n' % d for d in self.paths]
+        out.append('</g>\n</svg>\n')
+        return "".join(out)
@@ -0,0 +1,146 @@
+import numpy as np
+
+# packed form of grafoni stroke lists: one small opcode per stroke and a fixed (3,2) block of points per stroke
+# strokes with fewer than 3 points repeat their end point, so every transform is the same array operation for every kind of stroke
+opcodes = {'move':0,'line':1,'quadratic':2,'cubic':3}
+op_names = ['move','line','quadratic','cubic']
+op_points = np.array([1,1,2,3])
+
+class PackedStrokes:
+    def __init__(self,ops,coords):
+        self.ops = np.asarray(ops,dtype=np.uint8)
+        self.coords = np.asarray(coords,dtype=np.float64).reshape(len(self.ops),3,2)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __repr__(self):
+        return "PackedStrokes(%d strokes)" % len(self)
+
+    def to_strokes(self):
+        return unpack(self)
+
+    def translate(self,dx,dy):
+        return PackedStrokes(self.ops,self.coords + (dx,dy))
+
+    def scale(self,dx,dy):
+        return PackedStrokes(self.ops,self.coords * (dx,dy))
+
+    def shear(self,by=-1):
+        coords = self.coords.copy()
+        coords[...,0] += by*coords[...,1]
+        return PackedStrokes(self.ops,coords)
+
+    # m is a grafoni affine matrix (a,b,c,d,e,f)
+    def transform(self,m):
+        a,b,c,d,e,f = m
+        return PackedStrokes(self.ops,self.coords @ np.array([[a,b],[c,d]]) + (e,f))
+
+    # same box as grafoni.bounding_box, which always includes the origin
+    def bounding_box(self):
+        if len(self) == 0:
+            return 0, 0, 0, 0
+        points = self.coords.reshape(-1,2)
+        min_x, min_y = np.minimum(points.min(axis=0),0)
+        max_x, max_y = np.maximum(points.max(axis=0),0)
+        return float(min_x), float(min_y), float(max_x), float(max_y)
+
+    # every stroke as the four (n,2) point arrays of a cubic, starting where the stroke before it ended (at origin for the
+    # first). lines get control points a third of the way along, quadratics are raised to the same curve as a cubic
+    def cubics(self,origin=(0,0)):
+        p3 = self.coords[:,2]
+        p0 = np.concatenate([np.asarray(origin,dtype=np.float64).reshape(1,2),p3[:-1]])
+        p1 = self.coords[:,0].copy()
+        p2 = self.coords[:,1].copy()
+        line = self.ops == 1
+        p1[line] = p0[line] + (p3[line]-p0[line])/3
+        p2[line] = p0[line] + 2*(p3[line]-p0[line])/3
+        quadratic = self.ops == 2
+        q = self.coords[quadratic,0]
+        p1[quadratic] = p0[quadratic] + 2/3*(q-p0[quadratic])
+        p2[quadratic] = p3[quadratic] + 2/3*(q-p3[quadratic])
+        return p0, p1, p2, p3
+
+    # the drawn strokes as straight segments, in a list of pen-down runs that are each a (k,2) array of points.
+    # a run ends wherever a stroke doesn't start where the one drawn before it ended. lines are one segment and every
+    # curve gets just enough equal steps in t to stay within tolerance of the real curve (Wang's bound on the second
+    # differences of its control points), all curves at once
+    def flatten(self,tolerance=0.1,origin=(0,0)):
+        p0,p1,p2,p3 = self.cubics(origin)
+        drawn = np.flatnonzero(self.ops != 0)
+        if len(drawn) == 0:
+            return []
+        p0,p1,p2,p3 = p0[drawn],p1[drawn],p2[drawn],p3[drawn]
+        bend = np.maximum(np.hypot(*(p0-2*p1+p2).T),np.hypot(*(p1-2*p2+p3).T))
+        steps = np.maximum(1,np.ceil(np.sqrt(0.75*bend/tolerance))).astype(np.intp)
+        steps[self.ops[drawn] == 1] = 1
+        stroke = np.repeat(np.arange(len(drawn)),steps)
+        offsets = np.cumsum(steps) - steps
+        t = ((np.arange(len(stroke)) - offsets[stroke] + 1)/steps[stroke])[:,None]
+        s = 1 - t
+        points = s*s*s*p0[stroke] + 3*s*s*t*p1[stroke] + 3*s*t*t*p2[stroke] + t*t*t*p3[stroke]
+        new_run = np.ones(len(drawn),dtype=bool)
+        new_run[1:] = (p0[1:] != p3[:-1]).any(axis=1)
+        run_starts = np.flatnonzero(new_run)
+        pieces = np.split(points,offsets[run_starts[1:]])
+        return [np.concatenate([p0[i:i+1],piece]) for i,piece in zip(run_starts,pieces)]
+
+    # exact box of every stroke as drawn, as (n,4) rows of min_x, min_y, max_x, max_y. each stroke starts where the one
+    # before it ended (at origin for the first), and curves are measured at their ends and wherever their derivative is
+    # zero in between instead of at their control points. moves draw nothing, so their rows are inf, inf, -inf, -inf
+    def stroke_boxes(self,origin=(0,0)):
+        p0,p1,p2,p3 = self.cubics(origin)
+        lo = np.minimum(p0,p3)
+        hi = np.maximum(p0,p3)
+        # the derivative over 3 is a*t^2 + b*t + c on each axis
+        a = -p0 + 3*p1 - 3*p2 + p3
+        b = 2*(p0 - 2*p1 + p2)
+        c = p1 - p0
+        with np.errstate(divide="ignore",invalid="ignore"):
+            root = np.sqrt(b*b - 4*a*c)
+            flat = np.abs(a) < 1e-12
+            t1 = np.where(flat,-c/b,(-b + root)/(2*a))
+            t2 = np.where(flat,np.nan,(-b - root)/(2*a))
+        for t in (t1,t2):
+            inside = (t > 0) & (t < 1)
+            t = np.where(inside,t,0.5)
+            s = 1 - t
+            value = s*s*s*p0 + 3*s*s*t*p1 + 3*s*t*t*p2 + t*t*t*p3
+            lo = np.where(inside,np.minimum(lo,value),lo)
+            hi = np.where(inside,np.maximum(hi,value),hi)
+        boxes = np.concatenate([lo,hi],axis=1)
+        boxes[self.ops == 0] = (np.inf,np.inf,-np.inf,-np.inf)
+        return boxes
+
+# one box around many stroke boxes, (0,0,0,0) if nothing was drawn
+def box_of(boxes):
+    if len(boxes) == 0 or not np.isfinite(boxes[:,0]).any():
+        return 0.0, 0.0, 0.0, 0.0
+    min_x, min_y = boxes[:,:2].min(axis=0)
+    max_x, max_y = boxes[:,2:].max(axis=0)
+    return float(min_x), float(min_y), float(max_x), float(max_y)
+
+# boxes around the strokes in each (start, end) range, as an (n,4) array with inf, inf, -inf, -inf rows for ranges
+# where nothing is drawn
+def range_boxes(boxes,ranges):
+    if len(ranges) == 0:
+        return np.empty((0,4))
+    boxes = np.concatenate([boxes,[(np.inf,np.inf,-np.inf,-np.inf)]])
+    starts, ends = np.asarray(ranges,dtype=np.intp).reshape(-1,2).T
+    # reduceat gives the row at the start of an empty range, so point those at the empty row added at the end
+    empty = starts >= ends
+    starts = np.where(empty,len(boxes)-1,starts)
+    ends = np.where(empty,len(boxes)-1,ends)
+    bounds = np.stack([starts,ends],axis=1).reshape(-1)
+    lo = np.minimum.reduceat(boxes[:,:2],bounds)[0::2]
+    hi = np.maximum.reduceat(boxes[:,2:],bounds)[0::2]
+    return np.concatenate([lo,hi],axis=1)
+
+def pack(strokes):
+    ops = np.fromiter((opcodes[s[0]] for s in strokes),dtype=np.uint8,count=len(strokes))
+    coords = np.array([s[1:] + s[-2:]*((7-len(s))//2) for s in strokes],dtype=np.float64).reshape(len(strokes),6)
+    return PackedStrokes(ops,coords)
+
+def unpack(packed):
+    coords = packed.coords.reshape(len(packed),6).tolist()
+    return [(op_names[op],*c[:2*op_points[op]]) for op,c in zip(packed.ops.tolist(),coords)]
@@ -0,0 +1,150 @@
+import argparse
+import sys
+from math import sqrt
+import numpy as np
+import grafoni
+import packed_strokes
+
+# pen plotter output: the layout flattened to polylines in millimetres (y up, the text's top left corner at
+# (margin, height - margin)), the pen-down runs put in an order that keeps pen-up travel short, written as g-code or hpgl
+
+# strokes in glyph units to pen-down runs in millimetres, flattened to within tolerance millimetres
+def plot_runs(strokes,mm_per_unit = 1,tolerance = 0.05,margin = 10,transform = grafoni.identity):
+    min_x,min_y,max_x,max_y = grafoni.exact_bounding_box(strokes,transform)
+    to_mm = grafoni.compose(transform,(mm_per_unit,0,0,-mm_per_unit,margin-mm_per_unit*min_x,margin+mm_per_unit*max_y))
+    return packed_strokes.pack(strokes).transform(to_mm).flatten(tolerance,to_mm[4:])
+
+# how far the pen travels lifted to draw runs in order (each a (k,2) array, drawn from its first point), starting at start
+def pen_up_distance(runs,start = (0,0)):
+    if not runs:
+        return 0.0
+    starts = np.array([run[0] for run in runs])
+    ends = np.array([start] + [run[-1] for run in runs[:-1]],dtype=np.float64).reshape(-1,2)
+    return float(np.hypot(*(starts-ends).T).sum())
+
+def pen_down_distance(runs):
+    return float(sum(np.hypot(*np.diff(run,axis=0).T).sum() for run in runs))
+
+# nearest neighbour: from wherever the pen is, draw whichever run has an end closest next, from that end
+def nearest_neighbour(runs,start = (0,0)):
+    starts = np.array([run[0] for run in runs])
+    ends = np.array([run[-1] for run in runs])
+    left = np.ones(len(runs),dtype=bool)
+    pen = np.asarray(start,dtype=np.float64)
+    order = []
+    for _ in range(len(runs)):
+        to_start = np.where(left,np.hypot(*(starts-pen).T),np.inf)
+        to_end = np.where(left,np.hypot(*(ends-pen).T),np.inf)
+        i = int(np.argmin(np.minimum(to_start,to_end)))
+        reverse = to_end[i] < to_start[i]
+        order.append((i,reverse))
+        left[i] = False
+        pen = starts[i] if reverse else ends[i]
+    return order
+
+# 2-opt on the order of runs: drawing a stretch of runs backwards (each run reversed too) only changes the two lifts at
+# its ends, so for every first run all last runs within window are tried at once and the best improvement is kept,
+# until a pass finds nothing or passes run out
+def two_opt(runs,order,start = (0,0),passes = 10,window = 1000):
+    n = len(order)
+    runs_order = np.array([k for k,_ in order],dtype=np.intp)
+    reversed_runs = np.array([r for _,r in order],dtype=bool)
+    # where the pen goes down and comes up for every run in drawing order
+    firsts = np.array([runs[k][-1] if r else runs[k][0] for k,r in order],dtype=np.float64).reshape(n,2)
+    lasts = np.array([runs[k][0] if r else runs[k][-1] for k,r in order],dtype=np.float64).reshape(n,2)
+    start = np.asarray(start,dtype=np.float64)
+    for _ in range(passes):
+        improved = False
+        for i in range(n-1):
+            before = lasts[i-1] if i > 0 else start
+            j = np.arange(i+1,min(n,i+1+window))
+            has_after = j+1 < n
+            after = firsts[np.minimum(j+1,n-1)]
+            old = np.hypot(*(before-firsts[i])) + np.where(has_after,np.hypot(*(lasts[j]-after).T),0)
+            new = np.hypot(*(before-lasts[j]).T) + np.where(has_after,np.hypot(*(firsts[i]-after).T),0)
+            gain = old - new
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-9:
+                k = slice(i,j[best]+1)
+                firsts[k], lasts[k] = lasts[k][::-1].copy(), firsts[k][::-1].copy()
+                runs_order[k] = runs_order[k][::-1].copy()
+                reversed_runs[k] = ~reversed_runs[k][::-1]
+                improved = True
+        if not improved:
+            break
+    return list(zip(runs_order.tolist(),reversed_runs.tolist()))
+
+def apply_order(runs,order):
+    return [runs[k][::-1] if r else runs[k] for k,r in order]
+
+# runs reordered to cut pen-up travel, and a report of what that saved
+def optimize(runs,start = (0,0),passes = 10,window = 1000):
+    report = {"runs":len(runs),"pen_down":pen_down_distance(runs),"pen_up_before":pen_up_distance(runs,start)}
+    if runs:
+        order = nearest_neighbour(runs,start)
+        report["pen_up_nearest_neighbour"] = pen_up_distance(apply_order(runs,order),start)
+        runs = apply_order(runs,two_opt(runs,order,start,passes,window))
+    report["pen_up_after"] = pen_up_distance(runs,start)
+    return runs, report
+
+def write_gcode(runs,out,feed = 3000,pen_up = "G0 Z1",pen_down = "G1 Z0 F500",precision = 3):
+    number = lambda v: grafoni.format_number(v,precision)
+    out.write("G21\nG90\n%s\n" % pen_up)
+    for run in runs:
+        out.write("G0 X%s Y%s\n%s\n" % (number(run[0][0]),number(run[0][1]),pen_down))
+        out.write("".join("G1 X%s Y%s F%s\n" % (number(x),number(y),feed) for x,y in run[1:].tolist()))
+        out.write(pen_up + "\n")
+    out.write("G0 X0 Y0\n")
+
+# hpgl works in plotter units, 40 to the millimetre
+def write_hpgl(runs,out,units_per_mm = 40):
+    out.write("IN;SP1;")
+    for run in runs:
+        points = np.rint(run*units_per_mm).astype(np.int64).tolist()
+        out.write("PU%d,%d;PD%s;" % (points[0][0],points[0][1],",".join("%d,%d" % (x,y) for x,y in points[1:])))
+    out.write("PU0,0;SP0;\n")
+
+# lays out in_string like to_svg and writes it to the text stream out for a plotter, returning the travel report
+def plot(in_string,out,format = "gcode",mm_per_unit = 1,tolerance = 0.05,margin = 10,reorder = True,
+         wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,**options):
+    strokes = grafoni.layout_any(in_string,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale)
+    transform = grafoni.compose(grafoni.scale_matrix(1,v_scale),grafoni.shear_matrix(shear_val))
+    runs = plot_runs(strokes,mm_per_unit,tolerance,margin,transform)
+    if reorder:
+        runs, report = optimize(runs)
+    else:
+        report = {"runs":len(runs),"pen_down":pen_down_distance(runs),"pen_up_before":pen_up_distance(runs)}
+        report["pen_up_after"] = report["pen_up_before"]
+    report["segments"] = sum(len(run)-1 for run in runs)
+    if format == "gcode":
+        write_gcode(runs,out,**options)
+    elif format == "hpgl":
+        write_hpgl(runs,out,**options)
+    else:
+        raise ValueError("unknown plotter format " + repr(format))
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="write grafoni text for a pen plotter")
+    parser.add_argument("input",help="text file, - for stdin")
+    parser.add_argument("-o","--output",help="defaults to stdout")
+    parser.add_argument("--format",choices=["gcode","hpgl"],default="gcode")
+    parser.add_argument("--mm-per-unit",type=float,default=1)
+    parser.add_argument("--tolerance",type=float,default=0.05,help="largest distance in mm between a curve and its segments")
+    parser.add_argument("--margin",type=float,default=10)
+    parser.add_argument("--wrap",type=float,default=100)
+    parser.add_argument("--no-reorder",action="store_true")
+    args = parser.parse_args(argv)
+    text = sys.stdin.read() if args.input == "-" else open(args.input,encoding="utf-8").read()
+    out = open(args.output,"w") if args.output else sys.stdout
+    try:
+        report = plot(text,out,args.format,args.mm_per_unit,args.tolerance,args.margin,not args.no_reorder,wrap=args.wrap)
+    finally:
+        if args.output:
+            out.close()
+    print("%d runs, %d segments, pen down %.1f mm, pen up %.1f mm before and %.1f mm after reordering" %
+          (report["runs"],report["segments"],report["pen_down"],report["pen_up_before"],report["pen_up_after"]),file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
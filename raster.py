@@ -0,0 +1,166 @@
+import argparse
+import struct
+import sys
+import zlib
+from math import sqrt
+import numpy as np
+import grafoni
+import packed_strokes
+
+# bitmaps straight from strokes, without svg or an outside rasterizer: curves are flattened, long segments cut into
+# pieces no longer than piece pixels, and every piece is drawn as a round capped line into a fixed size patch of pixels
+# around it, a few thousand pieces at a time. a pixel is covered as far as its centre is within half a pixel of the
+# line's edge, and pieces are combined by taking the darkest cover, so joins and caps come out round.
+
+piece = 8
+batch = 4096
+
+def as_packed(strokes):
+    return strokes if isinstance(strokes,packed_strokes.PackedStrokes) else packed_strokes.pack(strokes)
+
+# (m,2,2) array of the straight segments of strokes after transform
+def segments(packed,transform = grafoni.identity,tolerance = 0.1):
+    runs = packed.transform(transform).flatten(tolerance,transform[4:])
+    if not runs:
+        return np.empty((0,2,2))
+    return np.concatenate([np.stack([run[:-1],run[1:]],axis=1) for run in runs])
+
+# coverage (0 to 1) of round capped lines width pixels wide along segments, into a float32 image of shape size (h,w)
+def draw_segments(segs,size,width,cover = None):
+    if cover is None:
+        cover = np.zeros(size,dtype=np.float32)
+    if len(segs) == 0:
+        return cover
+    height,image_width = cover.shape
+    radius = width/2
+    # cut long segments so every one fits the same patch
+    lengths = np.hypot(*(segs[:,1]-segs[:,0]).T)
+    parts = np.maximum(1,np.ceil(lengths/piece)).astype(np.intp)
+    which = np.repeat(np.arange(len(segs)),parts)
+    k = np.arange(len(which)) - np.repeat(np.cumsum(parts)-parts,parts)
+    start = segs[which,0]
+    step = (segs[which,1]-segs[which,0])/parts[which,None]
+    a = start + k[:,None]*step
+    b = a + step
+    patch = int(np.ceil(piece + 2*radius + 2)) + 1
+    grid = np.arange(patch)
+    flat = cover.reshape(-1)
+    for i in range(0,len(a),batch):
+        pa, pb = a[i:i+batch], b[i:i+batch]
+        corner = np.floor(np.minimum(pa,pb) - radius - 1).astype(np.intp)
+        # pixel centres of each patch, (n,patch) for x and for y
+        xs = corner[:,0,None] + grid
+        ys = corner[:,1,None] + grid
+        ab = pb - pa
+        ab_ab = (ab*ab).sum(axis=1)
+        ab_ab[ab_ab == 0] = 1
+        px = (xs + 0.5 - pa[:,0,None])[:,None,:]
+        py = (ys + 0.5 - pa[:,1,None])[:,:,None]
+        t = np.clip((px*ab[:,0,None,None] + py*ab[:,1,None,None])/ab_ab[:,None,None],0,1)
+        distance = np.hypot(px - t*ab[:,0,None,None],py - t*ab[:,1,None,None])
+        coverage = np.clip(radius + 0.5 - distance,0,1).astype(np.float32)
+        yy = np.broadcast_to(ys[:,:,None],coverage.shape)
+        xx = np.broadcast_to(xs[:,None,:],coverage.shape)
+        keep = (coverage > 0) & (xx >= 0) & (xx < image_width) & (yy >= 0) & (yy < height)
+        np.maximum.at(flat,yy[keep]*image_width + xx[keep],coverage[keep])
+    return cover
+
+# the same canvas svgStrokes would give: the exact box of the strokes, padded, at scale pixels to the unit
+def canvas(packed,scale = 4,padding = 1,transform = grafoni.identity):
+    min_x,min_y,max_x,max_y = packed_strokes.box_of(packed.transform(transform).stroke_boxes(transform[4:]))
+    to_pixels = grafoni.compose(transform,(scale,0,0,scale,scale*(padding-min_x),scale*(padding-min_y)))
+    size = (int(np.ceil(scale*(max_y-min_y+2*padding))),int(np.ceil(scale*(max_x-min_x+2*padding))))
+    return to_pixels, size
+
+# coverage image of strokes (a stroke list or PackedStrokes), drawn like svgStrokes draws them
+def rasterize(strokes,scale = 4,padding = 1,stroke_width = 1.0/3,transform = grafoni.identity,tolerance = 0.1):
+    packed = as_packed(strokes)
+    to_pixels, size = canvas(packed,scale,padding,transform)
+    return draw_segments(segments(packed,to_pixels,tolerance),size,stroke_width*scale)
+
+# black ink on white from a coverage image, or black ink on transparent with alpha
+def ink_pixels(cover,alpha = False):
+    ink = np.rint(cover*255).astype(np.uint8)
+    if alpha:
+        pixels = np.zeros(cover.shape + (4,),dtype=np.uint8)
+        pixels[...,3] = ink
+        return pixels
+    return 255 - ink
+
+def png_chunk(kind,data):
+    return struct.pack(">I",len(data)) + kind + data + struct.pack(">I",zlib.crc32(kind + data) & 0xffffffff)
+
+# png bytes of an 8 bit (h,w) grey or (h,w,4) rgba image
+def png_bytes(pixels,level = 6):
+    height,width = pixels.shape[:2]
+    color_type = 6 if pixels.ndim == 3 else 0
+    rows = np.zeros((height,1 + pixels[0].size),dtype=np.uint8)
+    rows[:,1:] = pixels.reshape(height,-1)
+    return (b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR",struct.pack(">IIBBBBB",width,height,8,color_type,0,0,0))
+            + png_chunk(b"IDAT",zlib.compress(rows.tobytes(),level)) + png_chunk(b"IEND",b""))
+
+# writes to the binary stream out, or to the file named out if it is a string
+def write_png(pixels,out,level = 6):
+    data = png_bytes(pixels,level)
+    if isinstance(out,str):
+        with open(out,"wb") as f:
+            f.write(data)
+    else:
+        out.write(data)
+
+# png of in_string laid out like to_svg, written to out if given (see write_png) and returned as bytes otherwise
+def to_png(in_string,out = None,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,scale = 4,padding = 1,stroke_width = 1.0/3,alpha = False):
+    strokes = grafoni.layout_any(in_string,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale)
+    transform = grafoni.compose(grafoni.scale_matrix(1,v_scale),grafoni.shear_matrix(shear_val))
+    pixels = ink_pixels(rasterize(strokes,scale,padding,stroke_width,transform),alpha)
+    if out is None:
+        return png_bytes(pixels)
+    write_png(pixels,out)
+
+# many snippets drawn into one image, left to right in rows of columns cells, every row as tall as its tallest snippet.
+# every snippet's segments are moved to its place first, so the whole atlas is drawn in one pass.
+# returns the coverage image and the (x, y, width, height) of every snippet in it
+def atlas(texts,columns = 16,gap = 2,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5,scale = 4,padding = 1,stroke_width = 1.0/3):
+    transform = grafoni.compose(grafoni.scale_matrix(1,v_scale),grafoni.shear_matrix(shear_val))
+    cells = []
+    for text in texts:
+        packed = as_packed(grafoni.layout_any(text,wrap=wrap,shear_val=shear_val,line_space=line_space,v_scale=v_scale))
+        placement, size = canvas(packed,scale,padding,transform)
+        cells.append((segments(packed,placement),size))
+    boxes = []
+    y = 0
+    width = 0
+    for row in range(0,len(cells),columns):
+        x = 0
+        row_height = 0
+        for segs,(h,w) in cells[row:row+columns]:
+            boxes.append((x,y,w,h))
+            x += w + gap
+            row_height = max(row_height,h)
+        width = max(width,x-gap)
+        y += row_height + gap
+    height = max(y-gap,0)
+    placed = [segs + (x,y) for (segs,_),(x,y,_,_) in zip(cells,boxes)]
+    segs = np.concatenate(placed) if placed else np.empty((0,2,2))
+    return draw_segments(segs,(height,width),stroke_width*scale), boxes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="render grafoni text to png")
+    parser.add_argument("input",help="text file, - for stdin")
+    parser.add_argument("output")
+    parser.add_argument("--scale",type=float,default=4)
+    parser.add_argument("--wrap",type=float,default=100)
+    parser.add_argument("--alpha",action="store_true")
+    parser.add_argument("--atlas",action="store_true",help="draw every line of the input as its own snippet in one image")
+    parser.add_argument("--columns",type=int,default=16)
+    args = parser.parse_args(argv)
+    text = sys.stdin.read() if args.input == "-" else open(args.input,encoding="utf-8").read()
+    if args.atlas:
+        cover,_ = atlas([line for line in text.splitlines() if line.strip()],args.columns,wrap=args.wrap,scale=args.scale)
+        write_png(ink_pixels(cover,args.alpha),args.output)
+    else:
+        to_png(text,args.output,wrap=args.wrap,scale=args.scale,alpha=args.alpha)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import argparse
+import os
+import random
+import sys
+from math import sqrt
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,here)
+
+import grafoni
+import glyph_tables
+import bench
+import incremental
+import corpus_stats
+
+# checks that the fast paths give the same output as the straightforward code they replaced, to run after changing the
+# glyph tables or the layout. each check prints what it compared and the first difference it finds, if any
+
+default_size = "3K"
+default_edits = 400
+default_sequences = 100*1000
+# most frequent words of the 1-gram list spelled for check_process_ends
+default_one_grams = 5000
+# layout_text adds each word's cached outline to where the word starts, instead of each glyph to where the last one ended
+tolerance = 1e-9
+
+# the layout loop from before layout() placed glyphs in place: it copies the whole stroke list at every glyph,
+# so it is quadratic in the length of chars, but it is the reference the faster layouts must match exactly
+def concat_layout(chars,wrap = 100,shear_val=-1/sqrt(3),line_space=20,v_scale=0.5):
+    out = [('move',0,0)]
+    last_char = " "
+    for l in chars:
+        if l in grafoni.letter_forms or l in grafoni.ligatures:
+            form = grafoni.letter_forms[l] if l in grafoni.letter_forms else grafoni.ligatures[l]
+            l_kern,r_kern,n_val = grafoni.kern_pair(last_char,l)
+            last_char = l
+            out = grafoni.concat(grafoni.v_nudge(grafoni.r_extend(out,l_kern),n_val),grafoni.l_extend(form,r_kern))
+        if last_char == " "  and out[-1][-2] + shear_val*v_scale*out[-1][-1] > wrap:
+            out.append(('move',-shear_val*v_scale*(out[-1][-1]+line_space),out[-1][-1]+line_space))
+    return out
+
+# the index of the first stroke of a and b that differ by more than tol, or None
+def first_difference(a,b,tol = 0):
+    for i,(s,t) in enumerate(zip(a,b)):
+        if s[0] != t[0] or len(s) != len(t) or any(abs(u-v) > tol for u,v in zip(s[1:],t[1:])):
+            return i
+    if len(a) != len(b):
+        return min(len(a),len(b))
+    return None
+
+def report(name,a,b,tol = 0):
+    i = first_difference(a,b,tol)
+    if i is None:
+        print("%s: same (%d strokes)" % (name,len(a)))
+        return True
+    print("%s: differ at stroke %d of %d/%d: %r != %r" % (name,i,len(a),len(b),a[i] if i < len(a) else None,b[i] if i < len(b) else None))
+    return False
+
+# layout() against the old loop, and the word at a time layouts against layout()
+def check_layout(text):
+    chars = grafoni.to_list(text)
+    strokes = grafoni.layout(chars)
+    ok = report("layout vs old loop",strokes,concat_layout(chars))
+    by_words = grafoni.layout_text(text)
+    ok &= report("layout_text vs layout",by_words,strokes,tolerance)
+    lines = [stroke for line in grafoni.layout_lines(text.split()) for stroke in line]
+    ok &= report("layout_lines vs layout_text",lines,by_words)
+    return ok
+
+# IncrementalRenderer against laying the whole text out again after each of edits random edits: a word inserted,
+# deleted, lengthened (so its outline changes) or appended
+def check_incremental(text,edits = default_edits,seed = 0):
+    rng = random.Random(seed)
+    words = text.split()
+    current = list(words)
+    renderer = incremental.IncrementalRenderer()
+    renderer.update(text)
+    for step in range(edits):
+        op = rng.random()
+        i = rng.randrange(len(current)+1)
+        if op < 0.4 or not current:
+            current.insert(i,rng.choice(words))
+        elif op < 0.7:
+            del current[min(i,len(current)-1)]
+        elif op < 0.9:
+            current[min(i,len(current)-1)] += rng.choice("aeiost")
+        else:
+            current.append(rng.choice(words))
+        first,_,paths = renderer.update(" ".join(current))
+        lines = list(grafoni.layout_lines(current))
+        if renderer.lines != lines:
+            strokes = [stroke for line in lines for stroke in line]
+            return report("incremental vs layout_lines after edit %d" % step,renderer.strokes(),strokes)
+        # lines the update kept were already checked by an earlier edit
+        redone = [grafoni.path_data(line,renderer.to_pixels) for line in lines[first:first+len(paths)]]
+        if len(renderer.paths) != len(lines) or paths != redone:
+            print("incremental vs layout_lines after edit %d: same strokes, different path data" % step)
+            return False
+    print("incremental vs layout_lines: same after %d edits" % edits)
+    return True
+
+# process_ends_many against process_ends, on the spellings of the most frequent words of the 1-gram list and on
+# random sequences of every glyph, end mark and a glyph no table knows, so every begin and end rule is reached
+def check_process_ends(sequences = default_sequences,one_grams = default_one_grams,seed = 0):
+    words = list(corpus_stats.one_gram_weights(top_n=one_grams))
+    grafoni.cached_ipa(" ".join(words))
+    spelled = [grafoni.grafoni_spell(w) for w in words]
+    rng = random.Random(seed)
+    symbols = sorted(set(grafoni.compiled_tables().names) | grafoni.end_marks) + ["?"]
+    spelled += [rng.choices(symbols,k=rng.randrange(8)) for _ in range(sequences)]
+    many = glyph_tables.process_ends_many(spelled)
+    for i,s in enumerate(spelled):
+        if many[i] != grafoni.process_ends(s):
+            print("process_ends_many vs process_ends: differ on %r: %r != %r" % (s,many[i],grafoni.process_ends(s)))
+            return False
+    print("process_ends_many vs process_ends: same on %d words and %d random sequences" % (len(words),sequences))
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="check the fast layout paths against the reference ones")
+    parser.add_argument("--size",default=default_size,help="characters of synthetic text, e.g. 3K")
+    parser.add_argument("--seed",type=int,default=0)
+    parser.add_argument("--edits",type=int,default=default_edits,help="random edits to replay through IncrementalRenderer")
+    parser.add_argument("--sequences",type=int,default=default_sequences,help="random glyph sequences for process_ends_many")
+    parser.add_argument("--one-grams-top",type=int,default=default_one_grams,help="1-gram list words for process_ends_many")
+    args = parser.parse_args(argv)
+    text = bench.synthetic_text(bench.parse_size(args.size),args.seed)
+    ok = check_layout(text)
+    ok &= check_incremental(text,args.edits,args.seed)
+    ok &= check_process_ends(args.sequences,args.one_grams_top,args.seed)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import grafoni
+
+# a long running renderer: an asyncio http front end (on a tcp port or a unix socket) handing renders to a pool of
+# worker processes, each of which keeps its pronunciation cache, word outlines and eng_to_ipa database warm between requests
+#   POST /render  body is the text, answers with svg. query options: wrap, shear_val, line_space, v_scale, precision, relative, dedup
+#   POST /glyphs  body is the text, answers with the json glyph list from grafoni.to_list
+#   GET  /stats   json throughput and latency numbers
+#   GET  /health
+# try it with: curl --data-binary @text.txt 'http://127.0.0.1:8765/render?precision=2'
+
+float_options = ["wrap","shear_val","line_space","v_scale"]
+int_options = ["precision"]
+bool_options = ["relative","dedup"]
+max_body = 16*1024*1024
+
+reasons = {200:"OK",400:"Bad Request",404:"Not Found",405:"Method Not Allowed",413:"Payload Too Large",500:"Internal Server Error"}
+
+def parse_options(query):
+    options = {}
+    for name,values in parse_qs(query).items():
+        value = values[-1]
+        if name in float_options:
+            options[name] = float(value)
+        elif name in int_options:
+            options[name] = int(value)
+        elif name in bool_options:
+            options[name] = value.lower() in ("1","true","yes","on")
+        else:
+            raise ValueError("unknown option " + repr(name))
+    return options
+
+# these run in the worker processes
+def render_svg(text,options):
+    return grafoni.render_chunk([text],options)[0].encode("utf-8")
+
+def render_glyphs(text):
+    return json.dumps(grafoni.to_list(text),ensure_ascii=False).encode("utf-8")
+
+class RenderServer:
+    def __init__(self,workers=None,ipa_cache_file=None,word_cache_file=None,window=1000):
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(self.workers,initializer=grafoni.init_render_worker,initargs=(ipa_cache_file,word_cache_file))
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.bytes_out = 0
+        # latencies of the last window renders, in seconds
+        self.latencies = deque(maxlen=window)
+
+    def __repr__(self):
+        return "RenderServer(%d workers, %d requests)" % (self.workers,self.requests)
+
+    # starts every worker now, so the first requests don't pay for process start up and cache loading
+    async def warm_up(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool,render_svg,"the",{}) for _ in range(self.workers)])
+
+    def stats(self):
+        uptime = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+        def percentile(p):
+            return latencies[min(len(latencies)-1,int(p*len(latencies)))] if latencies else 0
+        return {
+            "workers": self.workers,
+            "uptime": uptime,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "bytes_out": self.bytes_out,
+            "requests_per_second": self.requests/uptime if uptime else 0,
+            "latency_mean": sum(latencies)/len(latencies) if latencies else 0,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99),
+        }
+
+    async def render(self,f,*args):
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        self.in_flight += 1
+        try:
+            return await loop.run_in_executor(self.pool,f,*args)
+        finally:
+            self.in_flight -= 1
+            self.latencies.append(time.monotonic()-start)
+
+    # returns (status, content type, body)
+    async def respond(self,method,target,body):
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, "text/plain", b"ok\n"
+        if url.path == "/stats":
+            return 200, "application/json", json.dumps(self.stats()).encode("utf-8")
+        if url.path not in ("/render","/glyphs"):
+            return 404, "text/plain", b"not found\n"
+        if method != "POST":
+            return 405, "text/plain", b"use POST\n"
+        try:
+            text = body.decode("utf-8")
+            options = parse_options(url.query)
+        except ValueError as e:
+            return 400, "text/plain", (str(e) + "\n").encode("utf-8")
+        if url.path == "/glyphs":
+            return 200, "application/json", await self.render(render_glyphs,text)
+        return 200, "image/svg+xml", await self.render(render_svg,text,options)
+
+    # one http/1.1 connection, kept open for as many requests as the client sends
+    async def handle(self,reader,writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method,target,version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n",b"\n",b""):
+                        break
+                    name,_,value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length",0))
+                if length > max_body:
+                    status, content_type, body = 413, "text/plain", b"too large\n"
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    keep_alive = headers.get("connection","").lower() != "close" and version == "HTTP/1.1"
+                    try:
+                        status, content_type, body = await self.respond(method,target,body)
+                    except Exception as e:
+                        status, content_type, body = 500, "text/plain", (repr(e) + "\n").encode("utf-8")
+                self.requests += 1
+                self.errors += status >= 400
+                self.bytes_out += len(body)
+                writer.write(("HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n"
+                              % (status,reasons[status],content_type,len(body),"keep-alive" if keep_alive else "close")).encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError,asyncio.IncompleteReadError,ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self,host="127.0.0.1",port=8765,unix=None):
+        await self.warm_up()
+        if unix:
+            server = await asyncio.start_unix_server(self.handle,unix)
+            print("grafoni render server on unix socket %s with %d workers" % (unix,self.workers),flush=True)
+        else:
+            server = await asyncio.start_server(self.handle,host,port)
+            print("grafoni render server on http://%s:%d with %d workers" % (host,port,self.workers),flush=True)
+        # runs until SIGINT or SIGTERM
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT,signal.SIGTERM):
+            loop.add_signal_handler(sig,stopped.set)
+        async with server:
+            await stopped.wait()
+        if unix and os.path.exists(unix):
+            os.remove(unix)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="serve grafoni renders over http")
+    parser.add_argument("--host",default="127.0.0.1")
+    parser.add_argument("--port",type=int,default=8765)
+    parser.add_argument("--unix",help="listen on this unix socket instead of a tcp port")
+    parser.add_argument("--workers",type=int,default=None)
+    parser.add_argument("--ipa-cache-file")
+    parser.add_argument("--word-cache-file")
+    args = parser.parse_args(argv)
+    server = RenderServer(args.workers,args.ipa_cache_file,args.word_cache_file)
+    try:
+        asyncio.run(server.serve(args.host,args.port,args.unix))
+    finally:
+        server.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())